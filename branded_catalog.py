@@ -0,0 +1,282 @@
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import requests
+
+from nutrient_index import NutrientIndex
+
+BRANDED_ITEMS_PATH = "data/branded_items.sqlite"
+
+# Recipe lines like "nix:513fc9e73fe3ffd40300109f 120g" reference a catalog item by ID
+BRANDED_LINE = re.compile(r"^\s*nix:(\w+)\s+([\d.]+)\s*g?\s*$", re.IGNORECASE)
+
+
+def parse_branded_lines(query: str) -> Tuple[str, Dict[str, float]]:
+    """
+    Split branded item references out of a recipe.
+
+    Returns the remaining natural-language query and {nix_item_id: grams}.
+    """
+    lines, quantities = [], {}
+    for line in query.splitlines():
+        match = BRANDED_LINE.match(line)
+        if match:
+            quantities[match.group(1)] = quantities.get(match.group(1), 0.0) + float(match.group(2))
+        else:
+            lines.append(line)
+    return "\n".join(lines), quantities
+
+
+class RateLimiter:
+    """
+    Token bucket shared by the fetch threads: at most `rate` calls per second, in bursts up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class BrandedCatalog:
+    """
+    Local catalog of Nutritionix branded items keyed by nix_item_id.
+
+    Items live in an SQLite table with the per-gram nutrient vector over the
+    nutrient index as a float64 blob. On load the whole catalog is compiled
+    into an in-memory matrix with a dict from nix_item_id to row, so recipes
+    can resolve branded items without any API call or query. IDs missing
+    from memory are looked up in the table before they count as missing, so
+    items ingested by another process after loading are picked up.
+    """
+
+    def __init__(self, nutrient_index: NutrientIndex, path: str = BRANDED_ITEMS_PATH):
+        self.nutrient_index = nutrient_index
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS branded_items (
+                nix_item_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                brand TEXT NOT NULL,
+                serving_weight_grams REAL NOT NULL,
+                nutrient_version TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                fetched_at REAL NOT NULL
+            )""")
+        self.connection.commit()
+        self._load()
+
+    def _load(self):
+        # Rows written with a different nutrient mapping have a different vector layout and are skipped
+        rows = self.connection.execute(
+            "SELECT nix_item_id, name, brand, serving_weight_grams, vector FROM branded_items "
+            "WHERE nutrient_version = ?", (self.nutrient_index.version,)).fetchall()
+        self.items = [{"nix_item_id": item_id, "name": name, "brand": brand, "serving_weight_grams": grams}
+                      for item_id, name, brand, grams, _ in rows]
+        self._rows = {item["nix_item_id"]: row for row, item in enumerate(self.items)}
+        self.matrix = np.vstack([np.frombuffer(vector, dtype=np.float64) for *_, vector in rows]) if rows \
+            else np.empty((0, len(self.nutrient_index)), dtype=np.float64)
+
+    def _add_row(self, item: Dict[str, Any], vector: np.ndarray):
+        with self._lock:
+            row = self._rows.get(item["nix_item_id"])
+            if row is not None:
+                self.items[row] = item
+                self.matrix[row] = vector
+            else:
+                self._rows[item["nix_item_id"]] = len(self.items)
+                self.items.append(item)
+                self.matrix = np.vstack([self.matrix, vector])
+
+    def _load_items(self, nix_item_ids: List[str], batch_size: int = 500):
+        # Batched to stay under SQLite's limit on query parameters
+        rows = []
+        with self._lock:
+            for start in range(0, len(nix_item_ids), batch_size):
+                batch = nix_item_ids[start:start + batch_size]
+                rows += self.connection.execute(
+                    "SELECT nix_item_id, name, brand, serving_weight_grams, vector FROM branded_items "
+                    f"WHERE nutrient_version = ? AND nix_item_id IN ({', '.join('?' * len(batch))})",
+                    (self.nutrient_index.version, *batch)).fetchall()
+        for item_id, name, brand, grams, vector in rows:
+            self._add_row({"nix_item_id": item_id, "name": name, "brand": brand, "serving_weight_grams": grams},
+                          np.frombuffer(vector, dtype=np.float64))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, nix_item_id: str) -> bool:
+        return nix_item_id in self._rows
+
+    def get(self, nix_item_id: str) -> Optional[Dict[str, Any]]:
+        row = self._rows.get(nix_item_id)
+        return None if row is None else self.items[row]
+
+    def per_gram(self, nix_item_id: str) -> Optional[np.ndarray]:
+        row = self._rows.get(nix_item_id)
+        return None if row is None else self.matrix[row]
+
+    def missing(self, nix_item_ids: Iterable[str]) -> List[str]:
+        """
+        IDs not in the catalog yet, in order and without duplicates.
+        """
+        unknown = list(dict.fromkeys(item_id for item_id in nix_item_ids if item_id not in self._rows))
+        if unknown:
+            # Another process (usually this module's command line) may have ingested them since loading
+            self._load_items(unknown)
+        return [item_id for item_id in unknown if item_id not in self._rows]
+
+    def add_food(self, food: Dict[str, Any], nix_item_id: Optional[str] = None):
+        """
+        Store a food from a get_item response, scaled to per gram.
+        """
+        nix_item_id = nix_item_id or food.get("nix_item_id")
+        grams = food.get("serving_weight_grams") or 0
+        if not nix_item_id or grams <= 0:
+            raise ValueError(f"Branded item {nix_item_id} has no serving weight")
+        vector = self.nutrient_index.food_vector(food) / grams
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO branded_items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (nix_item_id, food.get("food_name", "Unknown"), food.get("brand_name") or "", float(grams),
+                 self.nutrient_index.version, vector.astype(np.float64).tobytes(), time.time()))
+            self.connection.commit()
+
+        self._add_row({"nix_item_id": nix_item_id, "name": food.get("food_name", "Unknown"),
+                       "brand": food.get("brand_name") or "", "serving_weight_grams": float(grams)}, vector)
+
+    def ingest(self, nutritionix_api, nix_item_ids: Iterable[str], workers: int = 4, rate: float = 5.0,
+               retries: int = 3, progress: Optional[Callable[[int, int, str], None]] = None) -> Dict[str, str]:
+        """
+        Fetch and store every ID not in the catalog yet. Returns {nix_item_id: error} for items that failed.
+
+        Fetches run on `workers` threads behind a shared rate limiter and each
+        worker commits its item as soon as it arrives. Failed requests and
+        connection errors are retried with backoff. When the run is
+        interrupted, queued fetches are dropped, so it stops promptly and a
+        rerun resumes where it stopped.
+        """
+        pending = self.missing(nix_item_ids)
+        limiter = RateLimiter(rate, burst=workers)
+
+        def fetch_and_store(nix_item_id):
+            for attempt in range(retries):
+                limiter.acquire()
+                try:
+                    response = nutritionix_api.get_item(nix_item_id)
+                except requests.RequestException as e:
+                    response = f"{type(e).__name__}: {e}"
+                if isinstance(response, dict):
+                    foods = response.get("foods") or []
+                    if not foods:
+                        raise ValueError("No food in response")
+                    self.add_food(foods[0], nix_item_id)
+                    return
+                if attempt < retries - 1:
+                    time.sleep(2 ** attempt)
+            raise ValueError(response)
+
+        errors = {}
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {executor.submit(fetch_and_store, nix_item_id): nix_item_id for nix_item_id in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                nix_item_id = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[nix_item_id] = str(e)
+                if progress:
+                    progress(done, len(pending), nix_item_id)
+        except BaseException:
+            # Interrupted (e.g. Ctrl+C): only the fetches already in flight finish
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        return errors
+
+    def to_foods(self, quantities: Dict[str, float]) -> List[Dict[str, Any]]:
+        """
+        Response-shaped foods for the given {nix_item_id: grams}.
+        """
+        foods = []
+        for nix_item_id, grams in quantities.items():
+            row = self._rows.get(nix_item_id)
+            if row is None:
+                raise KeyError(f"Branded item {nix_item_id} is not in the catalog")
+            item = self.items[row]
+            vector = self.matrix[row] * grams
+            foods.append({
+                "food_name": f"{grams:g}g {item['brand']} {item['name']}".replace("  ", " "),
+                "serving_qty": grams,
+                "serving_unit": "g",
+                "serving_weight_grams": float(grams),
+                **self.nutrient_index.nf_fields(vector),
+                "full_nutrients": self.nutrient_index.to_full_nutrients(vector),
+                "source": f"Nutritionix branded item {nix_item_id}",
+                "custom_ingredient": True,
+            })
+        return foods
+
+    def merge_into_response(self, response: Dict[str, Any], quantities: Dict[str, float]) -> Dict[str, Any]:
+        """
+        Append the referenced branded items to a response's foods, in place.
+        """
+        if quantities:
+            response.setdefault("foods", []).extend(self.to_foods(quantities))
+        return response
+
+
+def main():
+    from dotenv import load_dotenv
+    from nutritionix_api import NutritionixAPI
+
+    parser = argparse.ArgumentParser(description="Fetch branded Nutritionix items into the local catalog.")
+    parser.add_argument("ids_file", help="File with one nix_item_id per line")
+    parser.add_argument("--db", default=BRANDED_ITEMS_PATH, help="Catalog database path")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent requests")
+    parser.add_argument("--rate", type=float, default=5.0, help="Maximum requests per second")
+    args = parser.parse_args()
+
+    with open(args.ids_file) as f:
+        nix_item_ids = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    load_dotenv("../Credential/.env")
+    nutritionix_api = NutritionixAPI(app_id=os.getenv("NUTRITIONIX_APP_ID"), app_key=os.getenv("NUTRITIONIX_APP_KEY"))
+    catalog = BrandedCatalog(NutrientIndex(), args.db)
+    pending = len(catalog.missing(nix_item_ids))
+    print(f"{len(nix_item_ids) - pending} of {len(nix_item_ids)} items already in the catalog, fetching {pending}")
+
+    errors = catalog.ingest(nutritionix_api, nix_item_ids, workers=args.workers, rate=args.rate,
+                            progress=lambda done, total, _: print(f"\r{done}/{total}", end="", flush=True))
+    print()
+    for nix_item_id, error in errors.items():
+        print(f"Failed {nix_item_id}: {error}")
+    print(f"Catalog holds {len(catalog)} items")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import math
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Tuple
+
+import constants
+
+ROSTER_COLUMNS = ["dog", "weight_kg", "life_stage", "activity"]
+
+
+def _lookup_factors(values: pd.Series, factors: Dict[str, float], label: str) -> np.ndarray:
+    mapped = values.map(factors)
+    unknown = sorted(values[mapped.isna()].astype(str).unique())
+    if unknown:
+        raise ValueError(f"Unknown {label}: {', '.join(unknown)}. Expected one of: {', '.join(factors)}")
+    return mapped.to_numpy(dtype=np.float64)
+
+
+class FeedingPlanner:
+    """
+    Turns a recipe into daily portions and batch sheets for a roster of dogs.
+
+    All per-dog calculations are done on whole columns of the roster, so a
+    plan for thousands of dogs costs a handful of array operations.
+    """
+
+    def energy_requirements(self, roster: pd.DataFrame) -> pd.DataFrame:
+        """
+        Resting (RER) and maintenance (MER) energy requirement in kcal/day for each dog.
+        """
+        missing = [column for column in ROSTER_COLUMNS[1:] if column not in roster]
+        if missing:
+            raise ValueError(f"Roster is missing column(s): {', '.join(missing)}")
+
+        weights = roster["weight_kg"].to_numpy(dtype=np.float64)
+        if (~np.isfinite(weights) | (weights <= 0)).any():
+            raise ValueError("Every dog needs a positive weight_kg")
+
+        rer = constants.resting_energy_factor * weights ** 0.75
+        mer = (rer
+               * _lookup_factors(roster["life_stage"], constants.life_stage_energy_factors, "life stage")
+               * _lookup_factors(roster["activity"], constants.activity_energy_factors, "activity"))
+        return roster.assign(rer_kcal=rer, mer_kcal=mer)
+
+    def feeding_plan(self, roster: pd.DataFrame, kcal_per_kg: float) -> pd.DataFrame:
+        """
+        Daily energy requirement and grams of the recipe per day for each dog.
+        """
+        if kcal_per_kg <= 0:
+            raise ValueError("The recipe has no metabolizable energy")
+        plan = self.energy_requirements(roster)
+        plan["grams_per_day"] = plan["mer_kcal"].to_numpy() / kcal_per_kg * 1000
+        return plan
+
+    def recipe_kcal_per_kg(self, response: Dict[str, Any], metabolizable_energy: float) -> float:
+        """
+        Caloric density of the whole recipe as entered (ME over the total serving weight).
+        """
+        total_weight = sum(food.get("serving_weight_grams") or 0 for food in response.get("foods", []))
+        return metabolizable_energy / total_weight * 1000 if total_weight > 0 else 0
+
+    def batch_sheet(self, response: Dict[str, Any], total_grams: float,
+                    batch_size_grams: float) -> Tuple[int, pd.DataFrame]:
+        """
+        Scale the recipe's ingredients to equal production batches covering total_grams.
+
+        Returns the number of batches and one row per ingredient.
+        """
+        foods = [food for food in response.get("foods", []) if (food.get("serving_weight_grams") or 0) > 0]
+        if not foods or total_grams <= 0:
+            return 0, pd.DataFrame(columns=["Ingredient", "% of recipe", "Grams per batch", "Total grams"])
+
+        grams = np.array([food["serving_weight_grams"] for food in foods], dtype=np.float64)
+        fractions = grams / grams.sum()
+        batches = max(1, math.ceil(total_grams / batch_size_grams))
+        per_batch = total_grams / batches
+
+        sheet = pd.DataFrame({
+            "Ingredient": [food.get("food_name", "Unknown") for food in foods],
+            "% of recipe": fractions * 100,
+            "Grams per batch": fractions * per_batch,
+            "Total grams": fractions * total_grams,
+        })
+        return batches, sheet
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import re
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from nutrient_index import NutrientIndex
+from nutrient_store import normalize_food_name
+
+CUSTOM_INGREDIENTS_PATH = "data/custom_ingredients.json"
+
+
+class IngredientLibrary:
+    """
+    User-defined ingredients (supplements, premixes) with per-gram nutrient values.
+
+    Ingredients are persisted as JSON and compiled into a per-gram nutrient
+    matrix on load, so adding any number of them to a recipe is a single
+    matrix product and never calls the API.
+    """
+
+    def __init__(self, nutrient_index: NutrientIndex, path: Optional[str] = CUSTOM_INGREDIENTS_PATH):
+        self.nutrient_index = nutrient_index
+        self.path = path
+        self.ingredients = []
+        self.matrix = np.empty((0, len(nutrient_index)), dtype=np.float64)
+        self._rows = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.ingredients = json.load(f).get("ingredients", [])
+        self._compile()
+
+    def _compile(self):
+        self.matrix = np.full((len(self.ingredients), len(self.nutrient_index)), np.nan)
+        self._rows = {}
+        for row, ingredient in enumerate(self.ingredients):
+            self._rows[normalize_food_name(ingredient["name"])] = row
+            for attr_id, value in ingredient["nutrients"].items():
+                i = self.nutrient_index.position.get(int(attr_id))
+                if i is not None:
+                    self.matrix[row, i] = value
+
+    @property
+    def version(self) -> str:
+        """
+        Hash of the library contents, changes whenever an ingredient is added or edited.
+        """
+        return hashlib.sha256(json.dumps(self.ingredients, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self.ingredients)
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_food_name(name) in self._rows
+
+    @property
+    def names(self) -> List[str]:
+        return [ingredient["name"] for ingredient in self.ingredients]
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        row = self._rows.get(normalize_food_name(name))
+        return None if row is None else self.ingredients[row]
+
+    def per_gram(self, name: str) -> Optional[np.ndarray]:
+        """
+        Per-gram nutrient vector of an ingredient over the nutrient index (NaN where unknown), or None.
+        """
+        row = self._rows.get(normalize_food_name(name))
+        return None if row is None else self.matrix[row].copy()
+
+    def parse_custom_lines(self, query: str) -> Tuple[str, Dict[str, float]]:
+        """
+        Split lines naming a library ingredient, like "3g Flaxseed Meal" or "2 scoop Premix", out of a recipe.
+
+        Returns the remaining natural-language query and {name: quantity in the ingredient's unit}.
+        """
+        lines, quantities = [], {}
+        for line in query.splitlines():
+            ingredient, quantity = None, None
+            match = re.match(r"^\s*([\d.]+)\s*(\S*)\s+(.+?)\s*$", line)
+            if match:
+                quantity, unit, name = float(match.group(1)), match.group(2), match.group(3)
+                ingredient = self.get(name)
+                # "3g Flaxseed Meal" needs the ingredient's own unit; "3 Flaxseed Meal" may split as unit "Flaxseed"
+                if ingredient is not None and unit not in ("", ingredient["unit"]):
+                    ingredient = None
+                if ingredient is None and unit:
+                    ingredient = self.get(f"{unit} {name}")
+            if ingredient is None:
+                lines.append(line)
+            else:
+                quantities[ingredient["name"]] = quantities.get(ingredient["name"], 0.0) + quantity
+        return "\n".join(lines), quantities
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump({"ingredients": self.ingredients}, f, indent=2)
+
+    def add_ingredient(self, name: str, nutrients: Dict[int, float], unit: str = "g",
+                       grams_per_unit: float = 1, default_quantity: float = 1,
+                       source: str = "", cost_per_gram: Optional[float] = None):
+        """
+        Add or replace an ingredient. nutrients maps attr_id to the amount per gram.
+        """
+        if grams_per_unit <= 0:
+            raise ValueError("grams_per_unit must be positive")
+        unknown = [attr_id for attr_id in nutrients if int(attr_id) not in self.nutrient_index.position]
+        if unknown:
+            raise ValueError(f"Unknown attr_id(s): {unknown}")
+
+        ingredient = {
+            "name": name.strip(),
+            "unit": unit,
+            "grams_per_unit": grams_per_unit,
+            "default_quantity": default_quantity,
+            "source": source,
+            "cost_per_gram": cost_per_gram,
+            "nutrients": {str(int(attr_id)): float(value) for attr_id, value in nutrients.items()},
+        }
+        row = self._rows.get(normalize_food_name(name))
+        if row is None:
+            self.ingredients.append(ingredient)
+        else:
+            self.ingredients[row] = ingredient
+        self._compile()
+
+    def add_food(self, food: Dict[str, Any], name: Optional[str] = None, source: str = "Nutritionix",
+                 cost_per_gram: Optional[float] = None):
+        """
+        Add an ingredient from a food in a Nutritionix response, scaled to per gram.
+        """
+        grams = food.get("serving_weight_grams") or 0
+        if grams <= 0:
+            raise ValueError("Food has no serving weight")
+        nutrients = {nutrient["attr_id"]: nutrient.get("value", 0) / grams
+                     for nutrient in food.get("full_nutrients", [])
+                     if nutrient.get("attr_id") in self.nutrient_index.position}
+        self.add_ingredient(name or food.get("food_name", "Unknown"), nutrients,
+                            default_quantity=grams, source=source, cost_per_gram=cost_per_gram)
+
+    def to_foods(self, quantities: Dict[str, float]) -> List[Dict[str, Any]]:
+        """
+        Response-shaped foods for the given {name: quantity in the ingredient's unit}.
+        """
+        rows = np.array([self._rows[normalize_food_name(name)] for name in quantities], dtype=np.int64)
+        grams = np.array([quantity * self.ingredients[row]["grams_per_unit"]
+                          for row, quantity in zip(rows, quantities.values())], dtype=np.float64)
+        totals = self.matrix[rows] * grams[:, None]
+
+        foods = []
+        for row, quantity, food_grams, vector in zip(rows, quantities.values(), grams, totals):
+            ingredient = self.ingredients[row]
+            foods.append({
+                "food_name": f"{quantity:g}{ingredient['unit']} {ingredient['name']}",
+                "serving_qty": quantity,
+                "serving_unit": ingredient["unit"],
+                "serving_weight_grams": float(food_grams),
+                **self.nutrient_index.nf_fields(vector),
+                "full_nutrients": self.nutrient_index.to_full_nutrients(vector),
+                "source": ingredient["source"],
+                "custom_ingredient": True,
+            })
+        return foods
+
+    def merge_into_response(self, response: Dict[str, Any], quantities: Dict[str, float]) -> Dict[str, Any]:
+        """
+        Append the selected custom ingredients to a response's foods, in place.
+        """
+        if quantities:
+            response.setdefault("foods", []).extend(self.to_foods(quantities))
+        return response
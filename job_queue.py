@@ -0,0 +1,226 @@
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+JOB_STORE_PATH = "data/jobs.sqlite"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """
+    Handed to every task so it can report progress and notice cancellation.
+    """
+
+    def __init__(self, runner: "JobRunner", job_id: str, cancel_event: threading.Event):
+        self.runner = runner
+        self.job_id = job_id
+        self.cacheable = True
+        self._cancel_event = cancel_event
+
+    def skip_cache(self):
+        """
+        Keep this job's result out of the cache, e.g. when it holds errors worth retrying.
+        """
+        self.cacheable = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+    def report_progress(self, progress: float, message: str = ""):
+        self.check_cancelled()
+        self.runner._update(self.job_id, progress=min(max(progress, 0.0), 1.0), message=message)
+
+
+class JobRunner:
+    """
+    Local background job runner backed by a persistent SQLite queue.
+
+    Tasks are registered by kind and run on a thread pool, so API fetches,
+    batch evaluations and exports don't block the Streamlit script thread.
+    Jobs get an ID to poll for progress, can be cancelled, and finished
+    results are cached for cache_ttl seconds: submitting the same kind and
+    parameters again returns the earlier job. Failed jobs and jobs whose task
+    called skip_cache() are never reused. Jobs still queued or running when
+    the process stopped are picked up again by resume().
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH, max_workers: int = 4, cache_ttl: float = 24 * 3600):
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._tasks = {}
+        self._cancel_events = {}
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    cache_key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT NOT NULL DEFAULT '',
+                    result BLOB,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_cache_key ON jobs (cache_key, status)")
+            self.connection.commit()
+
+    def register(self, kind: str, task: Callable[..., Any]):
+        """
+        Register task(context, **params) to run jobs of the given kind.
+        """
+        self._tasks[kind] = task
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self._lock:
+            self.connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self.connection.commit()
+
+    def _start(self, job_id: str, kind: str, params: Dict[str, Any]):
+        cancel_event = threading.Event()
+        self._cancel_events[job_id] = cancel_event
+        self._executor.submit(self._run, job_id, kind, params, cancel_event)
+
+    def _run(self, job_id: str, kind: str, params: Dict[str, Any], cancel_event: threading.Event):
+        if cancel_event.is_set():
+            return
+        self._update(job_id, status=RUNNING)
+        try:
+            context = JobContext(self, job_id, cancel_event)
+            result = self._tasks[kind](context, **params)
+            # An empty cache key keeps the result readable by ID but never reused
+            cache_key = {} if context.cacheable else {"cache_key": ""}
+            self._update(job_id, status=DONE, progress=1.0, result=pickle.dumps(result), **cache_key)
+        except JobCancelled:
+            self._update(job_id, status=CANCELLED)
+        except Exception as e:
+            self._update(job_id, status=FAILED, error=f"{type(e).__name__}: {e}")
+        finally:
+            self._cancel_events.pop(job_id, None)
+
+    def submit(self, kind: str, use_cache: bool = True, **params) -> str:
+        """
+        Queue a job and return its ID. params must be JSON serializable.
+        """
+        if kind not in self._tasks:
+            raise ValueError(f"No task registered for job kind: {kind}")
+        params_json = json.dumps(params, sort_keys=True)
+        cache_key = hashlib.sha256(f"{kind}:{params_json}".encode("utf-8")).hexdigest()
+
+        with self._lock:
+            if use_cache:
+                # A still running or recently finished job with the same inputs is reused
+                row = self.connection.execute(
+                    "SELECT id FROM jobs WHERE cache_key = ? AND (status IN (?, ?) "
+                    "OR (status = ? AND updated_at >= ?)) ORDER BY created_at DESC LIMIT 1",
+                    (cache_key, RUNNING, QUEUED, DONE, time.time() - self.cache_ttl)).fetchone()
+                if row is not None:
+                    return row[0]
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self.connection.execute(
+                "INSERT INTO jobs (id, kind, params, cache_key, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", (job_id, kind, params_json, cache_key, QUEUED, now, now))
+            self.connection.commit()
+        self._start(job_id, kind, params)
+        return job_id
+
+    def resume(self) -> int:
+        """
+        Restart jobs left queued or running by a previous process. Returns how many were restarted.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT id, kind, params FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+        resumed = 0
+        for job_id, kind, params in rows:
+            if kind in self._tasks and job_id not in self._cancel_events:
+                self._update(job_id, status=QUEUED, progress=0.0, message="Resumed")
+                self._start(job_id, kind, json.loads(params))
+                resumed += 1
+        return resumed
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT kind, status, progress, message, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)).fetchone()
+        if row is None:
+            return None
+        kind, status, progress, message, error, created_at, updated_at = row
+        return {"id": job_id, "kind": kind, "status": status, "progress": progress, "message": message,
+                "error": error, "created_at": created_at, "updated_at": updated_at}
+
+    def result(self, job_id: str) -> Any:
+        """
+        Result of a finished job; raises if the job has not finished successfully.
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT status, result, error FROM jobs WHERE id = ?",
+                                          (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        status, result, error = row
+        if status != DONE:
+            raise RuntimeError(f"Job {job_id} is {status}" + (f": {error}" if error else ""))
+        return pickle.loads(result)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Ask a queued or running job to stop. Running tasks stop at their next progress report.
+        """
+        cancel_event = self._cancel_events.get(job_id)
+        if cancel_event is None:
+            return False
+        cancel_event.set()
+        with self._lock:
+            self.connection.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                                    (CANCELLED, time.time(), job_id, QUEUED))
+            self.connection.commit()
+        return True
+
+    def invalidate(self, kind: Optional[str] = None) -> int:
+        """
+        Drop finished jobs (of one kind, or all) from the result cache. Returns how many were dropped.
+        """
+        query, params = "UPDATE jobs SET cache_key = '' WHERE status = ? AND cache_key != ''", [DONE]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        with self._lock:
+            dropped = self.connection.execute(query, params).rowcount
+            self.connection.commit()
+        return dropped
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self.connection.execute("SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?",
+                                           (limit,)).fetchall()
+        return [self.status(job_id) for job_id, in rows]
@@ -0,0 +1,494 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Ingredients the simulated formulators pick recipes from
+INGREDIENT_POOL = [
+    "chicken breast", "chicken thigh", "ground beef", "beef liver", "chicken liver", "turkey", "salmon",
+    "sardines", "eggs", "white rice", "brown rice", "oats", "sweet potato", "potato", "carrots",
+    "green beans", "peas", "pumpkin", "spinach", "blueberries", "fish oil", "sunflower oil",
+    "cottage cheese", "plain yogurt", "lentils", "quinoa", "barley", "kale", "apple", "broccoli",
+]
+
+# Stages of the get_nutrient_info flow, as (stage, function replaced in nutritionix_UI). The fetch
+# runs on a background job thread, like saving the analysis and simulating batches (JOB_STAGES)
+STAGES = [
+    ("fetch", "complete_recipe"),
+    ("summary", "display_recipe_summary"),
+    ("top_nutrients", "display_top_nutrients"),
+    ("macronutrients", "display_macronutrient_pie_chart"),
+    ("calorie_chart", "food_item_calorie_chart"),
+    ("radar_charts", "display_nutrient_radar_chart"),
+    ("food_item_charts", "food_item_nutrient_chart"),
+    ("profile_compliance", "display_profile_compliance"),
+    ("compliance_probability", "display_compliance_probability"),
+]
+
+JOB_STAGES = ["fetch", "save", "simulation"]
+
+PERCENTILES = [50, 95, 99]
+
+# Seconds between the reruns a session makes while its jobs are running, like pressing "Refresh progress"
+POLL_INTERVAL = 0.02
+
+
+class NutritionixStandIn:
+    """
+    Local HTTP stand-in for the Nutritionix natural/nutrients and search/item endpoints.
+
+    Nutrient values are derived from a hash of the food name, so the same
+    ingredient always gets the same profile and every run sees the same data.
+    Some nutrients are left out of each food, like the real API does.
+    `latency` seconds are added to every request to mimic the network.
+    """
+
+    def __init__(self, nutrient_index, latency: float = 0.0):
+        self.nutrient_index = nutrient_index
+        self.latency = latency
+        # Typical amount per 100 g by unit, scaled by a random factor per food
+        self.scales = np.array([{"g": 2.0, "mg": 40.0, "kcal": 0.0}.get(unit, 20.0)
+                                for unit in nutrient_index.units])
+        self.server = None
+
+    def food(self, line: str) -> Dict[str, Any]:
+        match = re.match(r"^\s*([\d.]+)\s*g\s+(.*)$", line)
+        grams, name = (float(match.group(1)), match.group(2).strip()) if match else (100.0, line.strip())
+        rng = np.random.default_rng(zlib.crc32(name.lower().encode("utf-8")))
+        per_100g = self.scales * rng.gamma(1.0, 1.0, len(self.nutrient_index))
+        per_100g[rng.random(len(per_100g)) < 0.3] = np.nan
+        macros = self.nutrient_index.positions([203, 204, 205])
+        per_100g[macros] = rng.uniform([5, 1, 0], [30, 20, 50])
+        per_100g[self.nutrient_index.position[208]] = per_100g[macros] @ np.array([4, 9, 4])
+        vector = per_100g * grams / 100
+        return {
+            "food_name": name,
+            "serving_qty": grams,
+            "serving_unit": "g",
+            "serving_weight_grams": grams,
+            **self.nutrient_index.nf_fields(vector),
+            "full_nutrients": self.nutrient_index.to_full_nutrients(vector),
+        }
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, body: Dict[str, Any]):
+                time.sleep(stand_in.latency)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                if not self.path.startswith("/v2/natural/nutrients"):
+                    return self._reply(404, {"message": "Not found"})
+                length = int(self.headers.get("Content-Length", 0))
+                query = json.loads(self.rfile.read(length) or b"{}").get("query", "")
+                foods = [stand_in.food(line) for line in query.splitlines() if line.strip()]
+                if not foods:
+                    return self._reply(404, {"message": "We couldn't match any of your foods"})
+                self._reply(200, {"foods": foods})
+
+            def do_GET(self):
+                match = re.search(r"nix_item_id=(\w+)", self.path)
+                if not self.path.startswith("/v2/search/item") or not match:
+                    return self._reply(404, {"message": "Not found"})
+                food = stand_in.food(f"100g branded item {match.group(1)}")
+                food.update({"nix_item_id": match.group(1), "brand_name": "Stand-in"})
+                self._reply(200, {"foods": [food]})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class ResourceSampler:
+    """
+    Samples process CPU % and RSS on a background thread, with psutil when installed or /proc otherwise.
+    """
+
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self.samples = []
+        self.label = None
+        self._stop = threading.Event()
+        self._thread = None
+        try:
+            import psutil
+            self._process = psutil.Process()
+            self._process.cpu_percent()
+        except ImportError:
+            self._process = None
+
+    def _read(self):
+        if self._process is not None:
+            return self._process.cpu_percent(), self._process.memory_info().rss
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        return cpu_seconds, rss
+
+    def _run(self):
+        start = time.perf_counter()
+        previous_time, previous_cpu = start, self._read()[0]
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            cpu, rss = self._read()
+            if self._process is None:
+                # /proc gives cumulative CPU seconds, turn them into a percentage of one core
+                cpu, previous_cpu = (cpu - previous_cpu) / (now - previous_time) * 100, cpu
+            previous_time = now
+            self.samples.append({"time": round(now - start, 3), "level": self.label,
+                                 "cpu_percent": round(cpu, 1), "rss_mb": round(rss / 2 ** 20, 1)})
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class SessionDriver:
+    """
+    Runs simulated formulator sessions through nutritionix_UI.get_nutrient_info in bare mode.
+
+    Widget values and session state come from per-thread tables instead of a
+    browser, and the stage functions of the module are wrapped with timers,
+    so the real flow runs unchanged while each stage's latency is recorded.
+    A session reruns the page until its background jobs have finished; the
+    stages those jobs run are recorded per call in job_timings.
+    """
+
+    def __init__(self, ui, variability: bool = False):
+        self.ui = ui
+        self.variability = variability
+        self.job_timings = defaultdict(list)
+        self._job_timings_lock = threading.Lock()
+        self._local = threading.local()
+        self._patch_widgets()
+        self._patch_stages()
+
+    def _patch_widgets(self):
+        st = self.ui.st
+        st.session_state = SessionState()
+        for widget in ["text_input", "text_area", "button", "checkbox"]:
+            original = getattr(st, widget)
+
+            def patched(label, *args, _original=original, **kwargs):
+                inputs = getattr(self._local, "inputs", {})
+                return inputs[label] if label in inputs else _original(label, *args, **kwargs)
+
+            setattr(st, widget, patched)
+
+    def _timed(self, stage: str, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                timings = getattr(self._local, "timings", None)
+                if timings is not None:
+                    timings[stage] += elapsed
+                elif stage in JOB_STAGES:
+                    with self._job_timings_lock:
+                        self.job_timings[stage].append(elapsed)
+        return timed
+
+    def _polled(self, job_result):
+        # Notes whether the page is still waiting on a job, and counts failed jobs as session errors
+        def polled(job_id, what):
+            result = job_result(job_id, what)
+            job = self.ui.job_runner.status(job_id) if result is None and job_id else None
+            # A job that finished after the page polled it is picked up by the next rerun
+            if job is not None and job["status"] in (self.ui.QUEUED, self.ui.RUNNING, self.ui.DONE):
+                self._local.pending = True
+            elif job is not None:
+                self._local.error = f"{what} {job['status']}: {job['error']}"
+            return result
+        return polled
+
+    def _patch_stages(self):
+        for stage, function_name in STAGES:
+            setattr(self.ui, function_name, self._timed(stage, getattr(self.ui, function_name)))
+        store = self.ui.recipe_store
+        store.put = self._timed("save", store.put)
+        variability = self.ui.nutrient_variability
+        variability.simulate = self._timed("simulation", variability.simulate)
+        self.ui.job_result = self._polled(self.ui.job_result)
+
+    def run_session(self, recipe_name: str, recipe: str) -> Dict[str, Any]:
+        self._local.inputs = {
+            "Recipe name": recipe_name,
+            "Enter ingredient list:": recipe,
+            "Get nutrient info": True,
+            "Estimate compliance probability from nutrient variability": self.variability,
+        }
+        self._local.timings = defaultdict(float)
+        self._local.pending, self._local.error = False, None
+        self.ui.st.session_state.clear()
+        start = time.perf_counter()
+        try:
+            self.ui.get_nutrient_info()
+            self._local.inputs["Get nutrient info"] = False
+            while self._local.pending:
+                wait_start = time.perf_counter()
+                time.sleep(POLL_INTERVAL)
+                self._local.timings["job_wait"] += time.perf_counter() - wait_start
+                self._local.pending = False
+                self.ui.get_nutrient_info()
+        except Exception as e:
+            self._local.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.ui.plt.close("all")
+        timings = dict(self._local.timings)
+        timings["session"] = time.perf_counter() - start
+        self._local.inputs, self._local.timings = {}, None
+        return {"timings": timings, "error": self._local.error}
+
+
+class SessionState:
+    """
+    Stand-in for st.session_state with one state per thread, as each session thread is one browser.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def _state(self) -> Dict[str, Any]:
+        if not hasattr(self._local, "state"):
+            self._local.state = {}
+        return self._local.state
+
+    def __getitem__(self, key: str) -> Any:
+        return self._state[key]
+
+    def __setitem__(self, key: str, value: Any):
+        self._state[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._state
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._state.get(key, default)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        return self._state.setdefault(key, default)
+
+    def pop(self, key: str, *default: Any) -> Any:
+        return self._state.pop(key, *default)
+
+    def clear(self):
+        self._state.clear()
+
+
+def generate_recipes(rng: np.random.Generator, count: int) -> List[str]:
+    recipes = []
+    for _ in range(count):
+        names = rng.choice(INGREDIENT_POOL, size=rng.integers(4, 9), replace=False)
+        recipes.append("\n".join(f"{rng.integers(5, 400)}g {name}" for name in names))
+    return recipes
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    values_ms = np.array(values) * 1000
+    summary = {f"p{p}": round(float(np.percentile(values_ms, p)), 2) for p in PERCENTILES}
+    summary["mean"] = round(float(values_ms.mean()), 2)
+    return summary
+
+
+def run_level(driver: SessionDriver, sampler: ResourceSampler, concurrency: int, sessions: int,
+              rng: np.random.Generator) -> Dict[str, Any]:
+    recipes = generate_recipes(rng, sessions)
+    sampler.label = concurrency
+    first_sample = len(sampler.samples)
+    driver.job_timings.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="session") as executor:
+        results = list(executor.map(driver.run_session,
+                                    [f"Load test {concurrency}-{i}" for i in range(sessions)], recipes))
+    wall = time.perf_counter() - start
+    samples = sampler.samples[first_sample:]
+
+    stage_names = ["session", "job_wait"] + [stage for stage, _ in STAGES] + JOB_STAGES
+    stages = {}
+    for stage in dict.fromkeys(stage_names):
+        values = driver.job_timings[stage] if stage in JOB_STAGES else \
+            [result["timings"][stage] for result in results if stage in result["timings"]]
+        if values:
+            stages[stage] = percentiles(values)
+    errors = [result["error"] for result in results if result["error"]]
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "errors": len(errors),
+        "error_examples": sorted(set(errors))[:5],
+        "wall_seconds": round(wall, 3),
+        "throughput_sessions_per_second": round(sessions / wall, 3),
+        "stages_ms": stages,
+        "cpu_percent_mean": round(float(np.mean([s["cpu_percent"] for s in samples])), 1) if samples else None,
+        "cpu_percent_max": max((s["cpu_percent"] for s in samples), default=None),
+        "rss_mb_max": max((s["rss_mb"] for s in samples), default=None),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def markdown_report(report: Dict[str, Any]) -> str:
+    config = report["config"]
+    lines = [
+        "# Load test report",
+        "",
+        f"Commit `{report['environment']['commit']}`, {report['environment']['cpu_count']} CPUs, "
+        f"Python {report['environment']['python']}, seed {config['seed']}, "
+        f"API latency {config['api_latency_ms']} ms, variability {'on' if config['variability'] else 'off'}.",
+        "",
+        f"Nutrient store file: {report['nutrient_store']['saved_foods']} foods, "
+        f"{len(report['nutrient_store']['lost_foods'])} fetched foods lost.",
+        "",
+        "| Concurrency | Sessions | Errors | Sessions/s | p50 (ms) | p95 (ms) | p99 (ms) | CPU % mean | CPU % max | RSS max (MB) |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for level in report["levels"]:
+        session = level["stages_ms"].get("session", {})
+        lines.append(f"| {level['concurrency']} | {level['sessions']} | {level['errors']} | "
+                     f"{level['throughput_sessions_per_second']} | {session.get('p50')} | {session.get('p95')} | "
+                     f"{session.get('p99')} | {level['cpu_percent_mean']} | {level['cpu_percent_max']} | "
+                     f"{level['rss_mb_max']} |")
+    for level in report["levels"]:
+        lines += ["", f"## Concurrency {level['concurrency']}", "",
+                  "| Stage | p50 (ms) | p95 (ms) | p99 (ms) | mean (ms) |", "|---|---|---|---|---|"]
+        for stage, summary in level["stages_ms"].items():
+            lines.append(f"| {stage} | {summary['p50']} | {summary['p95']} | {summary['p99']} | {summary['mean']} |")
+        for error in level["error_examples"]:
+            lines.append(f"\nError: `{error}`")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive simulated sessions through get_nutrient_info against a local Nutritionix stand-in.")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--sessions", type=int, default=5, help="Sessions per concurrent user at each level")
+    parser.add_argument("--api-latency", type=float, default=100.0, help="Stand-in API latency in ms")
+    parser.add_argument("--variability", action="store_true", help="Include the compliance probability stage")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated recipes")
+    parser.add_argument("--sample-interval", type=float, default=0.25, help="CPU/RSS sampling interval in s")
+    parser.add_argument("--output", default="load_test_report", help="Report path without extension")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the scratch working directory")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    # The app writes its stores under data/, so it runs in a scratch copy and the real data is untouched
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    shutil.copytree(os.path.join(REPO_DIR, "data"), os.path.join(workdir, "data"),
+                    ignore=shutil.ignore_patterns("*.sqlite*", "nutrient_store.npz"))
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    os.environ["MPLBACKEND"] = "Agg"
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    from nutrient_index import NutrientIndex
+    stand_in = NutritionixStandIn(NutrientIndex(), latency=args.api_latency / 1000)
+    stand_in.start()
+    os.environ["NUTRITIONIX_BASE_URL"] = stand_in.url
+    try:
+        import nutritionix_UI
+        for logger_name in list(logging.root.manager.loggerDict):
+            if logger_name.startswith("streamlit"):
+                logging.getLogger(logger_name).setLevel(logging.ERROR)
+        driver = SessionDriver(nutritionix_UI, variability=args.variability)
+
+        # One untimed session so imports and lazy initialization don't count against level 1
+        driver.run_session("Warm-up", "100g chicken breast\n100g white rice")
+
+        rng = np.random.default_rng(args.seed)
+        sampler = ResourceSampler(args.sample_interval)
+        sampler.start()
+        results = []
+        for concurrency in levels:
+            result = run_level(driver, sampler, concurrency, concurrency * args.sessions, rng)
+            results.append(result)
+            session = result["stages_ms"].get("session", {})
+            print(f"concurrency {concurrency}: {result['throughput_sessions_per_second']} sessions/s, "
+                  f"p50 {session.get('p50')} ms, p95 {session.get('p95')} ms, p99 {session.get('p99')} ms, "
+                  f"{result['errors']} errors")
+        sampler.stop()
+
+        # Every food the sessions fetched has to have reached the store file, whichever session saved last
+        from nutrient_store import NutrientStore
+        saved_foods = set(NutrientStore(NutrientIndex()).names)
+        lost_foods = sorted(set(nutritionix_UI.nutrient_imputer.store.names) - saved_foods)
+        print(f"{len(saved_foods)} foods in the nutrient store file, {len(lost_foods)} lost")
+    finally:
+        stand_in.stop()
+        os.chdir(REPO_DIR)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "config": {"concurrency": levels, "sessions_per_user": args.sessions, "api_latency_ms": args.api_latency,
+                   "variability": args.variability, "seed": args.seed},
+        "environment": {"commit": git_commit(), "python": platform.python_version(),
+                        "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "levels": results,
+        "nutrient_store": {"saved_foods": len(saved_foods), "lost_foods": lost_foods},
+        "resources": sampler.samples,
+    }
+    with open(f"{output}.json", "w") as f:
+        json.dump(report, f, indent=2)
+    with open(f"{output}.md", "w") as f:
+        f.write(markdown_report(report))
+    print(f"Wrote {output}.json and {output}.md")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+import constants
+from nutrient_store import NutrientStore
+
+
+class NutrientImputer:
+    """
+    Fills nutrients a food is missing from its nearest neighbours in the nutrient store.
+
+    Each stored food is described by a normalized per-gram profile over
+    constants.similarity_nutrient_ids. The unit-length profiles are computed
+    once when the imputer is built and refreshed row by row with update() as
+    foods are added to the store, so imputing a recipe is one matrix product
+    against the store followed by a top-k selection per missing nutrient.
+    The feature scale, profiles and values are swapped in as one tuple, so
+    imputations running on other threads always see a matching set.
+    """
+
+    def __init__(self, store: NutrientStore, k: int = 5, min_similarity: float = 0.8,
+                 imputable_ids: Optional[List[int]] = None,
+                 similarity_ids: Optional[List[int]] = None):
+        self.store = store
+        self.k = k
+        self.min_similarity = min_similarity
+        self.imputable_ids = list(imputable_ids or constants.imputable_nutrient_ids)
+        nutrient_index = store.nutrient_index
+        self._feature_positions = nutrient_index.positions(similarity_ids or constants.similarity_nutrient_ids)
+        self._value_positions = nutrient_index.positions(self.imputable_ids)
+        self.nutrient_index = nutrient_index
+        self._build()
+
+    def _build(self):
+        features = np.nan_to_num(self.store.matrix[:, self._feature_positions])
+        # Scale every feature to [0, 1] so grams of protein don't drown out mg of sodium
+        scale = features.max(axis=0) if len(features) else np.ones(features.shape[1])
+        scale[scale == 0] = 1
+        self._state = (scale, self._normalize(features, scale), self.store.matrix[:, self._value_positions])
+
+    def update(self, rows: List[int]):
+        """
+        Refresh the profiles of store rows that were added or changed since the imputer was built.
+
+        Only those rows are normalized, unless a new food exceeds the current
+        feature scale, in which case every profile is rescaled.
+        """
+        if not rows:
+            return
+        rows = np.asarray(rows, dtype=np.int64)
+        # The store's lock keeps its names and matrix from growing while they are read
+        with self.store.lock:
+            scale, old_profiles, old_values = self._state
+            features = np.nan_to_num(self.store.matrix[np.ix_(rows, self._feature_positions)])
+            if (features > scale).any():
+                self._build()
+                return
+
+            n_foods = len(self.store.matrix)
+            profiles = np.zeros((n_foods, len(self._feature_positions)))
+            values = np.full((n_foods, len(self._value_positions)), np.nan)
+            profiles[:len(old_profiles)] = old_profiles
+            values[:len(old_values)] = old_values
+            profiles[rows] = self._normalize(features, scale)
+            values[rows] = self.store.matrix[np.ix_(rows, self._value_positions)]
+            self._state = (scale, profiles, values)
+
+    def add_response(self, response: Dict[str, Any]) -> List[int]:
+        """
+        Add a response's foods to the store, save it and refresh the changed profiles. Returns the changed rows.
+
+        The store's lock is held throughout, so concurrent analyses never lose
+        each other's foods.
+        """
+        with self.store.lock:
+            rows = self.store.add_response(response)
+            if rows:
+                rows += self.store.save()
+                self.update(rows)
+        return rows
+
+    @staticmethod
+    def _normalize(features: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        scaled = features / scale
+        norms = np.linalg.norm(scaled, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return scaled / norms
+
+    def impute_per_gram(self, per_gram: np.ndarray) -> np.ndarray:
+        """
+        Imputed per-gram values of the imputable nutrients for a matrix of foods.
+
+        per_gram has one row per food over the full nutrient index. The result
+        has one column per imputable nutrient and is NaN where no sufficiently
+        similar food reports that nutrient.
+        """
+        per_gram = np.atleast_2d(per_gram)
+        imputed = np.full((len(per_gram), len(self.imputable_ids)), np.nan)
+        # Read once: update() may swap in a new state while this runs
+        scale, profiles, stored_values = self._state
+        if len(profiles) == 0:
+            return imputed
+
+        queries = self._normalize(np.nan_to_num(per_gram[:, self._feature_positions]), scale)
+        similarity = queries @ profiles.T
+        k = min(self.k, len(profiles))
+
+        for column in range(len(self.imputable_ids)):
+            available = ~np.isnan(stored_values[:, column])
+            if not available.any():
+                continue
+            scores = np.where(available & (similarity >= self.min_similarity), similarity, -np.inf)
+            # Partial selection of the k most similar foods, no full sort
+            nearest = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            weights = np.take_along_axis(scores, nearest, axis=1)
+            weights = np.where(np.isfinite(weights), weights, 0)
+            values = np.nan_to_num(stored_values[nearest, column])
+            total_weight = weights.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                imputed[:, column] = np.where(total_weight > 0,
+                                              (weights * values).sum(axis=1) / total_weight, np.nan)
+        return imputed
+
+    def impute_response(self, response: Dict[str, Any]) -> Dict[str, List[int]]:
+        """
+        Add imputed nutrients to every food in the response, in place.
+
+        Imputed entries in full_nutrients carry "imputed": True and each food
+        lists its imputed attr_ids under "imputed_nutrients". Returns the
+        imputed attr_ids per food name.
+        """
+        foods = [food for food in response.get("foods", []) if (food.get("serving_weight_grams") or 0) > 0]
+        if not foods:
+            return {}
+
+        grams = np.array([food["serving_weight_grams"] for food in foods], dtype=np.float64)
+        per_gram = np.vstack([self.nutrient_index.food_vector(food) for food in foods]) / grams[:, None]
+        missing = np.isnan(per_gram[:, self._value_positions])
+        imputed = self.impute_per_gram(per_gram) * grams[:, None]
+
+        imputed_by_food = {}
+        for row, food in enumerate(foods):
+            filled = []
+            for column in np.flatnonzero(missing[row] & ~np.isnan(imputed[row])):
+                attr_id = self.imputable_ids[column]
+                food.setdefault("full_nutrients", []).append(
+                    {"attr_id": attr_id, "value": float(imputed[row, column]), "imputed": True})
+                filled.append(attr_id)
+            if filled:
+                food["imputed_nutrients"] = filled
+                imputed_by_food[food.get("food_name", "Unknown")] = filled
+        return imputed_by_food
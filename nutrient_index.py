@@ -0,0 +1,95 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, List
+
+import constants
+
+MAPPING_FILE_PATH = "data/Nutrition_mapping.csv"
+
+# Top-level nf_* fields of a natural/nutrients food and the attr_id each mirrors
+NF_FIELD_IDS = {
+    "nf_calories": 208,
+    "nf_total_fat": 204,
+    "nf_saturated_fat": 606,
+    "nf_cholesterol": 601,
+    "nf_sodium": 307,
+    "nf_total_carbohydrate": 205,
+    "nf_dietary_fiber": 291,
+    "nf_sugars": 269,
+    "nf_protein": 203,
+    "nf_potassium": 306,
+    "nf_p": 305,
+}
+
+
+class NutrientIndex:
+    """
+    Fixed ordering of Nutritionix attr_ids, used to lay out nutrient vectors.
+
+    Every nutrient vector in the project has one slot per row of
+    data/Nutrition_mapping.csv. Nutrients a food does not report are NaN, so
+    "missing" can be told apart from a measured zero.
+    """
+
+    def __init__(self, mapping_file_path: str = MAPPING_FILE_PATH):
+        mapping_df = pd.read_csv(mapping_file_path)
+        with open(mapping_file_path, "rb") as f:
+            self.version = hashlib.sha256(f.read()).hexdigest()[:16]
+        self.attr_ids = mapping_df['attr_id'].to_numpy(dtype=np.int64)
+        self.names = mapping_df['name'].tolist()
+        self.units = mapping_df['unit'].tolist()
+        # Grams per reported unit, NaN for non-mass units (kcal, kJ, IU)
+        self.grams_per_unit = np.array([constants.unit_to_grams.get(unit, np.nan) for unit in self.units])
+        self.position = {attr_id: i for i, attr_id in enumerate(self.attr_ids.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.attr_ids)
+
+    def positions(self, attr_ids: Iterable[int]) -> np.ndarray:
+        """
+        Vector positions for a list of attr_ids.
+        """
+        return np.array([self.position[attr_id] for attr_id in attr_ids], dtype=np.int64)
+
+    def food_vector(self, food: Dict[str, Any], fill: float = np.nan) -> np.ndarray:
+        """
+        Nutrient vector of one food from its full_nutrients list.
+        """
+        vector = np.full(len(self), fill, dtype=np.float64)
+        for nutrient in food.get("full_nutrients", []):
+            i = self.position.get(nutrient.get("attr_id"))
+            if i is not None:
+                value = nutrient.get("value", 0) or 0
+                vector[i] = value if np.isnan(vector[i]) else vector[i] + value
+        return vector
+
+    def response_matrix(self, response: Dict[str, Any], fill: float = np.nan) -> np.ndarray:
+        """
+        Stack the nutrient vectors of every food in a response, one row per food.
+        """
+        foods = response.get("foods", [])
+        matrix = np.full((len(foods), len(self)), fill, dtype=np.float64)
+        for row, food in enumerate(foods):
+            matrix[row] = self.food_vector(food, fill=fill)
+        return matrix
+
+    def response_vector(self, response: Dict[str, Any]) -> np.ndarray:
+        """
+        Recipe totals, treating missing nutrients as 0 like aggregate_nutrients does.
+        """
+        return self.response_matrix(response, fill=0.0).sum(axis=0)
+
+    def nf_fields(self, vector: np.ndarray) -> Dict[str, float]:
+        """
+        The nf_* summary fields of a food from its nutrient vector.
+        """
+        return {field: float(np.nan_to_num(vector[self.position[attr_id]]))
+                for field, attr_id in NF_FIELD_IDS.items()}
+
+    def to_full_nutrients(self, vector: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Convert a nutrient vector back to the full_nutrients list shape, skipping NaN.
+        """
+        present = np.flatnonzero(~np.isnan(vector))
+        return [{"attr_id": int(self.attr_ids[i]), "value": float(vector[i])} for i in present]
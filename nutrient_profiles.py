@@ -0,0 +1,195 @@
+import glob
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+import constants
+from nutrient_index import NutrientIndex
+
+PROFILES_DIR = "data/profiles"
+
+
+def metabolizable_energy(nutrient_vectors: np.ndarray, nutrient_index: NutrientIndex) -> np.ndarray:
+    """
+    Metabolizable energy (kcal) of one or many nutrient vectors, using the Atwater factors.
+    """
+    nutrient_vectors = np.nan_to_num(nutrient_vectors)
+    return (nutrient_vectors[..., nutrient_index.position[203]] * constants.atwater_factors["protein"]
+            + nutrient_vectors[..., nutrient_index.position[204]] * constants.atwater_factors["fat"]
+            + nutrient_vectors[..., nutrient_index.position[205]] * constants.atwater_factors["carbohydrate"])
+
+
+def profile_amounts(nutrient_vectors: np.ndarray, nutrient_index: NutrientIndex) -> np.ndarray:
+    """
+    Nutrient vectors as the profiles limit them: combined limits such as Met-Cystine get the summed amino acids.
+    """
+    nutrient_vectors = np.asarray(nutrient_vectors, dtype=np.float64)
+    amounts = nutrient_vectors.copy()
+    for attr_id, component_ids in constants.combined_nutrient_ids.items():
+        components = nutrient_vectors[..., nutrient_index.positions(component_ids)]
+        # Missing only when every amino acid of the pair is missing
+        amounts[..., nutrient_index.position[attr_id]] = np.where(
+            np.isnan(components).all(axis=-1), np.nan, np.nansum(components, axis=-1))
+    return amounts
+
+
+class NutrientProfiles:
+    """
+    Nutrient profiles (AAFCO, FEDIAF, NRC, ...) compiled into dense target matrices.
+
+    Every CSV in data/profiles holds per-1000-kcal-ME minimums and maximums for
+    one standard and species, one row per life stage and nutrient. On load they
+    are converted to the unit Nutritionix reports for each attr_id and compiled into `minimums` and `maximums` arrays of shape
+    (profiles, nutrients) aligned to the NutrientIndex, NaN where a profile sets
+    no limit, so a recipe is checked against every profile in one comparison.
+    Limits on amino acid pairs are checked against profile_amounts.
+    """
+
+    def __init__(self, nutrient_index: NutrientIndex, profiles_dir: str = PROFILES_DIR):
+        self.nutrient_index = nutrient_index
+        paths = sorted(glob.glob(os.path.join(profiles_dir, "*.csv")))
+        if not paths:
+            raise FileNotFoundError(f"No nutrient profiles found in {profiles_dir}")
+
+        digest = hashlib.sha256()
+        for path in paths:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        self.version = digest.hexdigest()[:16]
+
+        table = pd.concat([pd.read_csv(path, comment="#") for path in paths], ignore_index=True)
+        table["profile"] = table["standard"] + " " + table["species"] + " - " + table["life_stage"]
+        self.names = list(dict.fromkeys(table["profile"]))
+        self.nutrient_names = dict(zip(table["attr_id"], table["nutrient"]))
+
+        factors = self._unit_factors(table)
+        table["min"] = table["min"] * factors
+        table["max"] = table["max"] * factors
+        self.table = table
+
+        rows = table["profile"].map({name: i for i, name in enumerate(self.names)}).to_numpy()
+        columns = nutrient_index.positions(table["attr_id"])
+        self.minimums = np.full((len(self.names), len(nutrient_index)), np.nan)
+        self.maximums = np.full((len(self.names), len(nutrient_index)), np.nan)
+        self.minimums[rows, columns] = table["min"].to_numpy(dtype=np.float64)
+        self.maximums[rows, columns] = table["max"].to_numpy(dtype=np.float64)
+
+        # Only nutrients that some profile constrains take part in evaluation
+        self.columns = np.flatnonzero(~np.isnan(self.minimums).all(axis=0) | ~np.isnan(self.maximums).all(axis=0))
+        self.attr_ids = nutrient_index.attr_ids[self.columns]
+
+    def _unit_factors(self, table: pd.DataFrame) -> np.ndarray:
+        # Factor from each row's unit to the unit Nutritionix reports for its attr_id
+        factors = np.ones(len(table))
+        for row, (attr_id, unit) in enumerate(zip(table["attr_id"], table["unit"])):
+            target_unit = self.nutrient_index.units[self.nutrient_index.position[attr_id]]
+            if unit == target_unit:
+                continue
+            if unit in constants.unit_to_grams and target_unit in constants.unit_to_grams:
+                factors[row] = constants.unit_to_grams[unit] / constants.unit_to_grams[target_unit]
+            elif unit == "IU" and attr_id in constants.iu_conversions:
+                factors[row] = constants.iu_conversions[attr_id]
+            else:
+                raise ValueError(f"Profile unit {unit} for attr_id {attr_id} can't be converted to {target_unit}")
+        return factors
+
+    def targets(self, group: str, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Minimums per 1000 kcal ME of one nutrient group (protein, fat, mineral, vitamin) in the selected profiles.
+
+        One entry per nutrient, in profile file order, with the attr_ids whose
+        amounts add up to it and {profile: minimum} in the unit Nutritionix reports.
+        """
+        rows = self.table[(self.table["group"] == group) & self.table["min"].notna()]
+        if names is not None:
+            rows = rows[rows["profile"].isin(names)]
+        targets = []
+        for attr_id, nutrient_rows in rows.groupby("attr_id", sort=False):
+            attr_id = int(attr_id)
+            targets.append({
+                "nutrient": self.nutrient_names[attr_id],
+                "attr_ids": constants.combined_nutrient_ids.get(attr_id, [attr_id]),
+                "minimums": dict(zip(nutrient_rows["profile"], nutrient_rows["min"].astype(float))),
+            })
+        return targets
+
+    def select(self, names: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Row indices of the named profiles, all profiles when names is None.
+        """
+        if names is None:
+            return np.arange(len(self.names))
+        lookup = {name: i for i, name in enumerate(self.names)}
+        return np.array([lookup[name] for name in names], dtype=np.int64)
+
+    def evaluate(self, nutrient_vectors: np.ndarray, names: Optional[List[str]] = None,
+                 me: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        Compare recipe nutrient totals against the selected profiles.
+
+        nutrient_vectors is (nutrients,) or (recipes, nutrients). Targets are
+        scaled by each recipe's ME / 1000 like compare_against_targets. Arrays
+        in the result are indexed [recipe, profile, nutrient] over
+        self.attr_ids; limits a profile does not set always pass.
+        """
+        nutrient_vectors = profile_amounts(np.atleast_2d(nutrient_vectors), self.nutrient_index)
+        if me is None:
+            me = metabolizable_energy(nutrient_vectors, self.nutrient_index)
+        profile_rows = self.select(names)
+        scale = np.atleast_1d(me)[:, None, None] / 1000
+
+        actual = np.nan_to_num(nutrient_vectors[:, self.columns])[:, None, :]
+        minimum = self.minimums[np.ix_(profile_rows, self.columns)][None] * scale
+        maximum = self.maximums[np.ix_(profile_rows, self.columns)][None] * scale
+        meets_minimum = np.isnan(minimum) | (actual >= minimum)
+        meets_maximum = np.isnan(maximum) | (actual <= maximum)
+
+        return {
+            "profiles": [self.names[i] for i in profile_rows],
+            "attr_ids": self.attr_ids,
+            "me": np.atleast_1d(me),
+            "actual": actual[:, 0, :],
+            "minimum": minimum,
+            "maximum": maximum,
+            "meets_minimum": meets_minimum,
+            "meets_maximum": meets_maximum,
+            "compliant": (meets_minimum & meets_maximum).all(axis=2),
+        }
+
+    def compliance_table(self, nutrient_vector: np.ndarray, names: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        One row per (profile, constrained nutrient) for a single recipe.
+        """
+        return self.evaluation_table(self.evaluate(nutrient_vector, names))
+
+    def evaluation_table(self, evaluation: Dict[str, Any], names: Optional[List[str]] = None,
+                         recipe: int = 0) -> pd.DataFrame:
+        """
+        compliance_table for one recipe of an existing evaluate() result, e.g. one reopened from the recipe store.
+        """
+        rows = []
+        for p, profile in enumerate(evaluation["profiles"]):
+            if names is not None and profile not in names:
+                continue
+            for n, attr_id in enumerate(evaluation["attr_ids"]):
+                minimum = evaluation["minimum"][recipe, p, n]
+                maximum = evaluation["maximum"][recipe, p, n]
+                if np.isnan(minimum) and np.isnan(maximum):
+                    continue
+                if not evaluation["meets_minimum"][recipe, p, n]:
+                    status = "Below min"
+                elif not evaluation["meets_maximum"][recipe, p, n]:
+                    status = "Above max"
+                else:
+                    status = "OK"
+                rows.append({
+                    "Profile": profile,
+                    "Nutrient": self.nutrient_names.get(attr_id, str(attr_id)),
+                    "Actual": evaluation["actual"][recipe, n],
+                    "Min": minimum,
+                    "Max": maximum,
+                    "Status": status,
+                })
+        return pd.DataFrame(rows)
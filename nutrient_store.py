@@ -0,0 +1,147 @@
+import os
+import threading
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from nutrient_index import NutrientIndex
+
+NUTRIENT_STORE_PATH = "data/nutrient_store.npz"
+
+
+def normalize_food_name(food_name: str) -> str:
+    return " ".join(str(food_name).lower().split())
+
+
+class NutrientStore:
+    """
+    Local store of per-gram nutrient vectors for every food seen so far.
+
+    Foods are added from Nutritionix responses and persisted to a single .npz
+    file, so the store grows with each analysis and can be used as reference
+    data without calling the API. Sessions share one store: hold `lock`
+    across adding foods and saving, and save() merges in foods another
+    process wrote to the file since it was last read.
+    """
+
+    def __init__(self, nutrient_index: NutrientIndex, path: Optional[str] = NUTRIENT_STORE_PATH):
+        self.nutrient_index = nutrient_index
+        self.path = path
+        self.names = []
+        self.matrix = np.empty((0, len(nutrient_index)), dtype=np.float64)
+        self._rows = {}
+        self._file_version = None
+        self.lock = threading.RLock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, food_name: str) -> bool:
+        return normalize_food_name(food_name) in self._rows
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        with np.load(self.path, allow_pickle=False) as stored:
+            names = stored["names"].tolist()
+            attr_ids = stored["attr_ids"]
+            stored_matrix = stored["matrix"]
+
+        # Re-align the stored columns in case the mapping file has changed
+        matrix = np.full((len(names), len(self.nutrient_index)), np.nan)
+        for column, attr_id in enumerate(attr_ids.tolist()):
+            i = self.nutrient_index.position.get(attr_id)
+            if i is not None:
+                matrix[:, i] = stored_matrix[:, column]
+        return names, matrix
+
+    def load(self):
+        with self.lock:
+            self._file_version = self._stat()
+            self.names, self.matrix = self._read()
+            self._rows = {name: row for row, name in enumerate(self.names)}
+
+    def save(self) -> List[int]:
+        """
+        Write the store, first merging in foods that only the file has. Returns the rows merged in.
+        """
+        with self.lock:
+            merged = []
+            if self._stat() not in (None, self._file_version):
+                # Another process saved since we last read the file; foods in both keep our values
+                names, matrix = self._read()
+                new = [row for row, name in enumerate(names) if name not in self._rows]
+                merged = list(range(len(self.names), len(self.names) + len(new)))
+                for row in new:
+                    self._rows[names[row]] = len(self.names)
+                    self.names.append(names[row])
+                self.matrix = np.vstack([self.matrix, matrix[new]])
+
+            # Written to a temporary file and swapped in, so readers never load a half-written store
+            temporary_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary_path, "wb") as f:
+                np.savez(f, names=np.array(self.names, dtype=str), attr_ids=self.nutrient_index.attr_ids,
+                         matrix=self.matrix)
+            os.replace(temporary_path, self.path)
+            self._file_version = self._stat()
+            return merged
+
+    def get(self, food_name: str) -> Optional[np.ndarray]:
+        """
+        Per-gram nutrient vector of a stored food, or None.
+        """
+        row = self._rows.get(normalize_food_name(food_name))
+        return None if row is None else self.matrix[row]
+
+    def add_food(self, food: Dict[str, Any]) -> Optional[int]:
+        """
+        Add or replace one food, returning its row, or None when nothing changed.
+
+        Foods without a serving weight are skipped.
+        """
+        rows = self.add_foods([food])
+        return rows[0] if rows else None
+
+    def add_foods(self, foods: List[Dict[str, Any]]) -> List[int]:
+        """
+        Add or replace several foods, returning the rows that were added or changed.
+
+        New foods are stacked onto the matrix in one step, so adding a large
+        response doesn't copy the matrix once per food.
+        """
+        entries = []
+        for food in foods:
+            grams = food.get("serving_weight_grams") or 0
+            name = normalize_food_name(food.get("food_name", ""))
+            if grams > 0 and name:
+                entries.append((name, self.nutrient_index.food_vector(food) / grams))
+
+        with self.lock:
+            first_new = len(self.names)
+            new_names = list(dict.fromkeys(name for name, _ in entries if name not in self._rows))
+            if new_names:
+                self.matrix = np.vstack([self.matrix, np.full((len(new_names), self.matrix.shape[1]), np.nan)])
+                for name in new_names:
+                    self._rows[name] = len(self.names)
+                    self.names.append(name)
+
+            rows = []
+            for name, per_gram in entries:
+                row = self._rows[name]
+                if row < first_new and np.array_equal(self.matrix[row], per_gram, equal_nan=True):
+                    continue
+                self.matrix[row] = per_gram
+                rows.append(row)
+        return list(dict.fromkeys(rows))
+
+    def add_response(self, response: Dict[str, Any]) -> List[int]:
+        """
+        Add every food of a response, returning the rows that were added or changed.
+        """
+        return self.add_foods(response.get("foods", []))
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, List, Optional
+
+from nutrient_profiles import NutrientProfiles, metabolizable_energy
+
+NUTRIENT_CV_PATH = "data/nutrient_cv.csv"
+DEFAULT_CV = 0.15
+
+
+class NutrientVariability:
+    """
+    Monte Carlo estimate of how likely a recipe is to meet nutrient profiles.
+
+    Each food's amount of each nutrient is drawn from a lognormal distribution
+    with mean equal to the reported value and the coefficient of variation
+    from data/nutrient_cv.csv. Draws are independent per food and nutrient.
+    Every simulated batch is then checked against the profiles in one
+    vectorized evaluation.
+    """
+
+    def __init__(self, nutrient_profiles: NutrientProfiles, cv_path: str = NUTRIENT_CV_PATH,
+                 default_cv: float = DEFAULT_CV):
+        self.nutrient_profiles = nutrient_profiles
+        self.nutrient_index = nutrient_profiles.nutrient_index
+        cv_df = pd.read_csv(cv_path, comment="#")
+        cv = np.full(len(self.nutrient_index), default_cv)
+        known = cv_df["attr_id"].isin(self.nutrient_index.position)
+        cv[self.nutrient_index.positions(cv_df.loc[known, "attr_id"])] = cv_df.loc[known, "cv"]
+
+        # Only the profile nutrients and the macronutrients behind ME need sampling
+        macro_columns = self.nutrient_index.positions([203, 204, 205])
+        self.columns = np.union1d(nutrient_profiles.columns, macro_columns)
+        sigma_squared = np.log1p(cv[self.columns] ** 2)
+        self._sigma = np.sqrt(sigma_squared).astype(np.float32)
+        self._mu = (-sigma_squared / 2).astype(np.float32)
+
+    def sample_totals(self, food_matrix: np.ndarray, n_samples: int,
+                      rng: np.random.Generator) -> np.ndarray:
+        """
+        Simulated recipe totals, shape (n_samples, nutrients) over the full nutrient index.
+        """
+        foods = np.nan_to_num(food_matrix[:, self.columns]).astype(np.float32)
+        noise = rng.standard_normal((n_samples, foods.shape[0], len(self.columns)), dtype=np.float32)
+        factors = np.exp(self._mu + self._sigma * noise)
+        totals = np.zeros((n_samples, len(self.nutrient_index)))
+        totals[:, self.columns] = np.einsum("sfn,fn->sn", factors, foods)
+        return totals
+
+    def simulate(self, response: Dict[str, Any], n_samples: int = 10000,
+                 profile_names: Optional[List[str]] = None, seed: Optional[int] = None,
+                 chunk_size: int = 5000,
+                 progress: Optional[Callable[[float, str], None]] = None) -> Dict[str, Any]:
+        """
+        Probability of meeting each minimum and maximum of the selected profiles.
+
+        Returns per-nutrient probabilities with shape (profiles, nutrients) over
+        nutrient_profiles.attr_ids and the probability of meeting the whole
+        profile. progress is called after every chunk; an exception it raises
+        stops the simulation.
+        """
+        rng = np.random.default_rng(seed)
+        food_matrix = self.nutrient_index.response_matrix(response, fill=0.0)
+        profiles = self.nutrient_profiles.select(profile_names)
+        meets_minimum = np.zeros((len(profiles), len(self.nutrient_profiles.columns)))
+        meets_maximum = np.zeros_like(meets_minimum)
+        compliant = np.zeros(len(profiles))
+
+        # Sample in chunks to bound memory for large sample counts
+        for start in range(0, n_samples, chunk_size):
+            size = min(chunk_size, n_samples - start)
+            totals = self.sample_totals(food_matrix, size, rng)
+            evaluation = self.nutrient_profiles.evaluate(
+                totals, profile_names, me=metabolizable_energy(totals, self.nutrient_index))
+            meets_minimum += evaluation["meets_minimum"].sum(axis=0)
+            meets_maximum += evaluation["meets_maximum"].sum(axis=0)
+            compliant += evaluation["compliant"].sum(axis=0)
+            if progress:
+                progress((start + size) / n_samples, f"Simulated {start + size:,} of {n_samples:,} batches")
+
+        return {
+            "profiles": [self.nutrient_profiles.names[i] for i in profiles],
+            "attr_ids": self.nutrient_profiles.attr_ids,
+            "n_samples": n_samples,
+            "p_meets_minimum": meets_minimum / n_samples,
+            "p_meets_maximum": meets_maximum / n_samples,
+            "p_compliant": compliant / n_samples,
+        }
+
+    def probability_table(self, simulation: Dict[str, Any]) -> pd.DataFrame:
+        """
+        One row per (profile, constrained nutrient) with the probability of meeting each limit.
+        """
+        profile_rows = self.nutrient_profiles.select(simulation["profiles"])
+        positions = self.nutrient_profiles.columns
+        rows = []
+        for p, profile in enumerate(simulation["profiles"]):
+            has_minimum = ~np.isnan(self.nutrient_profiles.minimums[profile_rows[p], positions])
+            has_maximum = ~np.isnan(self.nutrient_profiles.maximums[profile_rows[p], positions])
+            for n, attr_id in enumerate(simulation["attr_ids"]):
+                if not (has_minimum[n] or has_maximum[n]):
+                    continue
+                rows.append({
+                    "Profile": profile,
+                    "Nutrient": self.nutrient_profiles.nutrient_names.get(attr_id, str(attr_id)),
+                    "P(meets min)": simulation["p_meets_minimum"][p, n] if has_minimum[n] else np.nan,
+                    "P(meets max)": simulation["p_meets_maximum"][p, n] if has_maximum[n] else np.nan,
+                })
+        return pd.DataFrame(rows)
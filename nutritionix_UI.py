@@ -1,4 +1,7 @@
+import io
+import json
 import os
+import time
 import streamlit as st
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -13,6 +16,18 @@ import plotly.graph_objects as go
 
 # Importing necessary modules and functions from nutritionix_api.py
 from nutritionix_api import NutritionixAPI, NutrientCalculator
+from nutrient_index import NutrientIndex
+from nutrient_store import NutrientStore
+from nutrient_imputation import NutrientImputer
+from ingredient_library import IngredientLibrary
+from nutrient_profiles import NutrientProfiles, profile_amounts
+from feeding_plan import FeedingPlanner, ROSTER_COLUMNS
+from nutrient_variability import NutrientVariability
+from recipe_comparison import RecipeComparison
+from recipe_store import RecipeStore, analysis_key, normalize_ingredients
+from job_queue import JobRunner, QUEUED, RUNNING, DONE
+from pareto_explorer import ParetoExplorer
+from branded_catalog import BrandedCatalog, parse_branded_lines
 import constants
 
 # Load API keys from .env file
@@ -20,43 +35,102 @@ load_dotenv("../Credential/.env")
 app_id = os.getenv('NUTRITIONIX_APP_ID')
 app_key = os.getenv('NUTRITIONIX_APP_KEY')
 
-# Initialize the Nutritionix_api client
-nutritionix_api = NutritionixAPI(app_id=app_id, app_key=app_key)
+# Initialize the Nutritionix_api client once per server process, so its
+# response cache survives reruns and is shared between sessions
+@st.cache(allow_output_mutation=True)
+def load_nutritionix_api(app_id, app_key):
+    return NutritionixAPI(app_id=app_id, app_key=app_key)
+
+nutritionix_api = load_nutritionix_api(app_id, app_key)
+
+@st.cache(allow_output_mutation=True)
+def load_recipe_store():
+    return RecipeStore(NutrientIndex())
+
+recipe_store = load_recipe_store()
+
+# The nutrient store and the imputer's precomputed profiles are kept for the
+# life of the server process and updated incrementally as foods come in
+@st.cache(allow_output_mutation=True)
+def load_nutrient_imputer():
+    return NutrientImputer(NutrientStore(NutrientIndex()))
+
+nutrient_imputer = load_nutrient_imputer()
+
+# Branded items ingested with branded_catalog.py, resolved locally by nix_item_id
+@st.cache(allow_output_mutation=True)
+def load_branded_catalog():
+    return BrandedCatalog(NutrientIndex())
+
+branded_catalog = load_branded_catalog()
+
+# Slow work (API fetches, batch evaluations, optimizer runs) goes to a shared
+# background job runner so it doesn't hold up the script thread. The tasks
+# reach the shared stores' locks, which st.cache can't hash by value
+@st.cache(allow_output_mutation=True, hash_funcs={"_thread.lock": id, "_thread.RLock": id})
+def load_job_runner():
+    runner = JobRunner()
+    runner.register("analyse_recipe", analyse_recipe_job)
+    runner.register("compliance_probability", compliance_probability_job)
+    runner.register("feeding_plan", feeding_plan_job)
+    runner.register("fetch_recipes", fetch_recipes_job)
+    runner.register("pareto_front", pareto_front_job)
+    runner.resume()
+    return runner
 nutrient_calculator = NutrientCalculator()
+nutrient_index = NutrientIndex()
+nutrient_profiles = NutrientProfiles(nutrient_index)
+feeding_planner = FeedingPlanner()
+nutrient_variability = NutrientVariability(nutrient_profiles)
+recipe_comparison = RecipeComparison(nutrient_index, nutrient_profiles)
+
+# Job for widgets that submit on every rerun. The session keeps the job it got first for the same
+# inputs, so a job cancelled or failed on this page isn't submitted again until the inputs change
+def submit_job(kind, **params):
+    jobs = st.session_state.setdefault("jobs", {})
+    request = json.dumps([kind, params], sort_keys=True)
+    if request not in jobs:
+        jobs[request] = job_runner.submit(kind, **params)
+    return jobs[request]
+
+
+# Progress of a background job; returns its result once done, None while it runs or if it failed
+def job_result(job_id, what):
+    job = job_runner.status(job_id) if job_id else None
+    if job is None:
+        return None
+    if job["status"] in (QUEUED, RUNNING):
+        st.progress(job["progress"])
+        st.write(job["message"] or f"{what}: waiting to start...")
+        col1, col2 = st.columns(2)
+        col1.button("Refresh progress", key=f"refresh_{job_id}")
+        if col2.button("Cancel", key=f"cancel_{job_id}"):
+            job_runner.cancel(job_id)
+        return None
+    if job["status"] != DONE:
+        st.error(f"{what} {job['status']}" + (f": {job['error']}" if job["error"] else ""))
+        return None
+    return job_runner.result(job_id)
 
 # 1. Create a summary of the recipe with food names and quantities
-def display_recipe_summary(response):
+def display_recipe_summary(response, summary):
+    # The summary is the one saved with the analysis, so the totals are not recomputed here
     summary_items = []
-    total_weight = 0
-    total_water = 0
-    total_calories = 0
-    aggregated_nutrients = nutrient_calculator.aggregate_nutrients(response)
-    total_water = aggregated_nutrients.get(255, 0)
-    calcium = aggregated_nutrients.get(301, 0)
-    phosphorus = aggregated_nutrients.get(305, 0)
     
     for food in response.get("foods", []):
         food_name = food.get("food_name", "Unknown")
         serving_qty = food.get("serving_weight_grams", 0)
         serving_unit = food.get("serving_unit", "g")
-        calories = food.get("nf_calories", 0)
-        
-        # Calculate total weight and total calories
-        total_weight += serving_qty
-        total_calories += calories
-        
         summary_items.append((f"{food_name} ({serving_qty}{serving_unit})", serving_qty))
     
     summary_items.sort(key=lambda x: x[1], reverse=True)
     sorted_summary_strings = [item[0] for item in summary_items]
     
-    # Calculate caloric density and metabolizable energy using the NutrientCalculator class
-    caloric_content_info = nutrient_calculator.calculate_calorie_content_me(aggregated_nutrients)
-    me = caloric_content_info['metabolizable_energy']  
-    caloric_content_me = caloric_content_info['caloric_content']  
-    
-    water_percentage = (total_water / total_weight) * 100 if total_weight > 0 else 0
-    ca_p_ratio =calcium / phosphorus if phosphorus != 0 else 0
+    total_weight = summary["weight"]
+    me = summary["me"]
+    caloric_content_me = summary["kcal_per_kg"]
+    ca_p_ratio = summary["ca_p_ratio"]
+    water_percentage = summary["moisture"]
     
     st.subheader("Recipe Snapshot:")
     st.write(", ".join(sorted_summary_strings))
@@ -78,6 +152,40 @@ def display_recipe_summary(response):
     # Display the table in Streamlit
     st.table(table_df.set_index(""))
 
+# 1.1 Top 10 nutrients, ranked numerically
+NUTRIENT_RANKINGS = {
+    "Amount": "amount",
+    "Density per 1000 kcal ME": "density",
+    "% of profile minimum": "percent_target",
+}
+
+def display_top_nutrients(response, ranking, profile_names):
+    by = NUTRIENT_RANKINGS[ranking]
+    targets = None
+    if by == "percent_target":
+        if not profile_names:
+            st.warning("Select a nutrient profile to rank by % of its minimums")
+            return
+        targets = nutrient_profiles.minimums[nutrient_profiles.select(profile_names[:1])[0]]
+
+    nutrient_vector = nutrient_index.response_vector(response)
+    names = list(nutrient_index.names)
+    if targets is not None:
+        # Profile minimums on amino acid pairs (Met-Cystine, Phe-Tyrosine) apply to their sum
+        nutrient_vector = profile_amounts(nutrient_vector, nutrient_index)
+        for attr_id in constants.combined_nutrient_ids:
+            names[nutrient_index.position[attr_id]] = nutrient_profiles.nutrient_names.get(attr_id, str(attr_id))
+    positions, scores = nutrient_calculator.rank_nutrients(nutrient_vector, nutrient_index, by=by, targets=targets)
+    score_label = {"amount": "Grams", "density": "g per 1000 kcal ME", "percent_target": "% of minimum"}[by]
+    top_df = pd.DataFrame({
+        "Nutrient": [names[i] for i in positions[0]],
+        "Amount": [f"{nutrient_vector[i]:.4g} {nutrient_index.units[i]}" for i in positions[0]],
+        score_label: scores[0],
+    }).dropna()
+
+    st.subheader("Top 10 Nutrients:")
+    st.table(top_df.set_index("Nutrient"))
+
 # 2. Dsipaly pie chart for calorie source
 def display_macronutrient_pie_chart(aggregated_nutrients):
     # Extract data from calculate_calorie_content_me
@@ -154,16 +262,19 @@ def food_item_calorie_chart(response):
     # Display in Streamlit
     st.pyplot(ax.figure)
 
-# 4.1 Comparison to AAFCO target
-def display_nutrient_radar_chart(comparison_results, title, response=None, shrink=False):
-    # ... [rest of the function code]
+# 4.1 Comparison to the minimums of the selected nutrient profiles, one chart per group
+TARGET_GROUPS = [("protein", "Amino acids"), ("fat", "Fatty acids"), ("mineral", "Minerals"), ("vitamin", "Vitamins")]
+
+def display_nutrient_radar_chart(comparison_results, title, response=None, shrink=False, overlays=None):
+    # overlays: optional {recipe name: comparison_results} drawn on top of the
+    # main recipe; the targets shown are those of the main recipe
     
     # Extract nutrient names, actual values, and target values from comparison_results
     # Note: The values are already in logarithmic scale.
     nutrient_names = list(comparison_results.keys())
     actual_values = [comparison_results[nutrient]['Actual'] for nutrient in nutrient_names]
-    target_values_adult = [comparison_results[nutrient]['Target Adult'] for nutrient in nutrient_names]
-    target_values_puppy = [comparison_results[nutrient]['Target Puppy'] for nutrient in nutrient_names]
+    profile_names = list(dict.fromkeys(key for results in comparison_results.values()
+                                       for key in results if key != 'Actual'))
     
     # Create a DataFrame for actual values
     df_actual = pd.DataFrame(dict(
@@ -176,23 +287,19 @@ def display_nutrient_radar_chart(comparison_results, title, response=None, shrin
     fig.update_traces(fill='toself', line=dict(color='red'))  # Set color for Actual
     fig.data[0].name = 'Actual'
     
-    # Add Target Adult trace
-    target_adult_df = pd.DataFrame(dict(
-        r=target_values_adult + target_values_adult[:1],
-        theta=nutrient_names + nutrient_names[:1]
-    ))
-    fig.add_trace(go.Scatterpolar(r=target_adult_df['r'], 
-                                  theta=target_adult_df['theta'], fill='toself', 
-                                  line=dict(color='blue'), name='Target Adult'))
+    # Add one target trace per profile; a nutrient the profile sets no minimum for is left open
+    for profile_name in profile_names:
+        target_values = [comparison_results[nutrient].get(profile_name) for nutrient in nutrient_names]
+        fig.add_trace(go.Scatterpolar(r=target_values + target_values[:1],
+                                      theta=nutrient_names + nutrient_names[:1], fill='toself',
+                                      name=profile_name))
     
-    # Add Target Puppy trace
-    target_puppy_df = pd.DataFrame(dict(
-        r=target_values_puppy + target_values_puppy[:1],
-        theta=nutrient_names + nutrient_names[:1]
-    ))
-    fig.add_trace(go.Scatterpolar(r=target_puppy_df['r'], 
-                                  theta=target_puppy_df['theta'], fill='toself', 
-                                  line=dict(color='green'), name='Target Puppy'))
+    # Add one Actual trace per overlaid recipe
+    for recipe_name, overlay_results in (overlays or {}).items():
+        overlay_values = [overlay_results[nutrient]['Actual'] for nutrient in nutrient_names]
+        fig.add_trace(go.Scatterpolar(r=overlay_values + overlay_values[:1],
+                                      theta=nutrient_names + nutrient_names[:1],
+                                      name=recipe_name))
     
     # Add legend and title
     fig.update_layout(
@@ -219,16 +326,13 @@ def food_item_nutrient_chart(response, targets, title):
         
         # Iterate through each target nutrient and calculate the quantity in this food item
         for target in targets:
-            attr_id = target["attr_id"]
-            aafco_nutrient = target["aafco_nutrient"]
-            
-            # Get the quantity of this nutrient in the current food item
-            nutrient_quantity = next((nutrient.get("value", 0) \
-                                      for nutrient in food.get("full_nutrients", []) \
-                                      if nutrient.get("attr_id") == attr_id), 0)
+            # Get the quantity of this nutrient in the current food item, summed for amino acid pairs
+            nutrient_quantity = sum(nutrient.get("value", 0)
+                                    for nutrient in food.get("full_nutrients", [])
+                                    if nutrient.get("attr_id") in target["attr_ids"])
             
             # Add the nutrient quantity to the food_data dictionary
-            food_data[food_name][aafco_nutrient] = nutrient_quantity
+            food_data[food_name][target["nutrient"]] = nutrient_quantity
     
     # Convert the nested dictionary to a DataFrame
     df = pd.DataFrame.from_dict(food_data, orient='index')
@@ -242,116 +346,449 @@ def food_item_nutrient_chart(response, targets, title):
     st.plotly_chart(fig)
 
 
-# 5.final UI presentation
+# 4.3 Heatmap of target nutrients across several recipes
+def recipe_nutrient_heatmap(comparison, targets, title):
+    amounts = np.column_stack([np.nansum(comparison["matrix"][:, nutrient_index.positions(target["attr_ids"])], axis=1)
+                               for target in targets])
+    df = pd.DataFrame(amounts, index=comparison["names"], columns=[target["nutrient"] for target in targets])
+    df = df.sort_index(axis=1)
+    fig = ff.create_annotated_heatmap(z=df.values, x=df.columns.tolist(),
+                                      y=df.index.tolist(),
+                                      annotation_text=np.round(df.values, 2), colorscale='YlGnBu')
+    fig.update_layout(title=title)
+    st.plotly_chart(fig)
+
+# 4.4 Compliance against several nutrient profiles at once
+def display_profile_compliance(saved, profile_names):
+    # Saved pass/fail bits cover every profile loaded at save time; anything
+    # else is evaluated from the saved nutrient vector
+    if set(profile_names) <= set(saved["evaluation"]["profiles"]):
+        compliance_df = nutrient_profiles.evaluation_table(saved["evaluation"], profile_names)
+    else:
+        compliance_df = nutrient_profiles.compliance_table(saved["nutrients"], profile_names)
+    if compliance_df.empty:
+        return
+
+    st.subheader("Compliance across nutrient profiles")
+    summary_df = compliance_df.groupby("Profile", sort=False)["Status"].agg(
+        Compliant=lambda status: "Yes" if (status == "OK").all() else "No",
+        Failing=lambda status: ", ".join(compliance_df.loc[status.index[status != "OK"], "Nutrient"]))
+    st.table(summary_df)
+    st.dataframe(compliance_df.pivot(index="Nutrient", columns="Profile", values="Status"))
+
+
+# 4.5 Probability of compliance given natural nutrient variability
+def compliance_probability_job(context, key, profile_names, n_samples):
+    # Progress is reported between chunks, which is also where a cancelled job stops
+    return nutrient_variability.simulate(recipe_store.get(key)["response"], n_samples, profile_names,
+                                         progress=context.report_progress)
+
+
+def display_compliance_probability(key, profile_names, n_samples):
+    st.subheader("Compliance probability (Monte Carlo)")
+    simulation = job_result(submit_job("compliance_probability", key=key, profile_names=profile_names,
+                                       n_samples=n_samples), "Simulation")
+    if simulation is None:
+        return
+    st.table(pd.DataFrame({"P(meets profile)": simulation["p_compliant"]}, index=simulation["profiles"]))
+
+    # Only show the limits that are not met in every simulated batch
+    probability_df = nutrient_variability.probability_table(simulation)
+    at_risk = (probability_df["P(meets min)"] < 1) | (probability_df["P(meets max)"] < 1)
+    st.dataframe(probability_df[at_risk])
+
+
+# 4.6 Daily portions and batch sheet for a roster of dogs
+def feeding_plan_job(context, key, roster_csv, days, batch_size_kg):
+    saved = recipe_store.get(key)
+    response = saved["response"]
+    kcal_per_kg = feeding_planner.recipe_kcal_per_kg(response, saved["summary"]["me"])
+    plan = feeding_planner.feeding_plan(pd.read_csv(io.StringIO(roster_csv)), kcal_per_kg)
+    context.report_progress(0.5, f"Planning batches for {len(plan)} dogs")
+    total_grams = plan["grams_per_day"].sum() * days
+    batches, sheet = feeding_planner.batch_sheet(response, total_grams, batch_size_kg * 1000)
+    context.report_progress(0.9, "Writing the exports")
+    return {"plan": plan, "sheet": sheet, "batches": batches, "total_grams": total_grams,
+            "plan_csv": plan.to_csv(index=False), "sheet_csv": sheet.to_csv(index=False)}
+
+
+def display_feeding_plan(key, roster_file, days, batch_size_kg):
+    st.subheader("Feeding Plan")
+    feeding = job_result(submit_job("feeding_plan", key=key, roster_csv=roster_file.getvalue().decode("utf-8"),
+                                    days=int(days), batch_size_kg=float(batch_size_kg)), "Feeding plan")
+    if feeding is None:
+        return
+
+    plan = feeding["plan"]
+    st.write(f"{len(plan)} dogs, {plan['mer_kcal'].sum():,.0f} kcal/day, "
+             f"{feeding['total_grams'] / 1000:,.1f} kg for {days} day(s) in {feeding['batches']} batch(es) "
+             f"of {batch_size_kg} kg")
+    st.dataframe(plan)
+    st.table(feeding["sheet"].set_index("Ingredient"))
+    st.download_button("Download feeding plan", feeding["plan_csv"], file_name="feeding_plan.csv")
+    st.download_button("Download batch sheet", feeding["sheet_csv"], file_name="batch_sheet.csv")
+
+
+# 5. Add a custom ingredient to the library
+def add_custom_ingredient_form(ingredient_library):
+    with st.expander("Add custom ingredient"):
+        with st.form("custom_ingredient_form"):
+            name = st.text_input("Name")
+            unit = st.text_input("Unit", value="g")
+            grams_per_unit = st.number_input("Grams per unit", min_value=0.001, value=1.0)
+            default_quantity = st.number_input("Default quantity", min_value=0.0, value=1.0)
+            source = st.text_input("Source")
+            cost_per_gram = st.number_input("Cost per gram", min_value=0.0, value=0.0)
+            nutrients_input = st.text_area("Nutrients per gram, one 'attr_id: value' per line")
+            if st.form_submit_button("Save ingredient") and name:
+                try:
+                    nutrients = {int(attr_id): float(value) for attr_id, value in
+                                 (line.split(":") for line in nutrients_input.splitlines() if line.strip())}
+                    ingredient_library.add_ingredient(name, nutrients, unit=unit, grams_per_unit=grams_per_unit,
+                                                      default_quantity=default_quantity, source=source,
+                                                      cost_per_gram=cost_per_gram or None)
+                    ingredient_library.save()
+                    st.success(f"Saved {name}")
+                except ValueError as e:
+                    st.error(f"Could not save ingredient: {e}")
+
+
+# 6. Fetch a recipe and complete it with imputed nutrients, custom ingredients and branded items
+def complete_recipe(ingredients_input, custom_quantities, ingredient_library, is_imputation_enabled):
+    """
+    The analysed response of a recipe and the attr_ids imputed per food, without any Streamlit calls.
+
+    Shared by every mode so a recipe gets the same nutrients wherever it is
+    analysed. Lines naming a library ingredient ("3g Flaxseed Meal") or a
+    branded item ("nix:<id> 120g") are resolved locally. Raises ValueError
+    when the recipe can't be analysed.
+    """
+    ingredients_input, branded_quantities = parse_branded_lines(ingredients_input)
+    ingredients_input, line_quantities = ingredient_library.parse_custom_lines(ingredients_input)
+    custom_quantities = {**line_quantities, **custom_quantities}
+    unknown = branded_catalog.missing(branded_quantities)
+    if unknown:
+        raise ValueError(f"Branded items not in the catalog: {', '.join(unknown)}. "
+                         "Ingest them with branded_catalog.py first.")
+    response = nutritionix_api.get_nutrients(query=ingredients_input) \
+                if ingredients_input.strip() else {"foods": []}
+    if not isinstance(response, dict):
+        raise ValueError(f"Nutritionix request failed: {response}")
+
+    # Grow the local nutrient store and refresh only the changed rows of the
+    # imputer, then fill gaps from similar foods
+    nutrient_imputer.add_response(response)
+    imputed_by_food = nutrient_imputer.impute_response(response) if is_imputation_enabled else {}
+
+    # Custom ingredients and branded items are added after imputation, their values are used as entered
+    ingredient_library.merge_into_response(response, custom_quantities)
+    branded_catalog.merge_into_response(response, branded_quantities)
+    return response, imputed_by_food
+
+
+def display_imputed_nutrients(imputed_by_food):
+    if imputed_by_food:
+        st.caption("Imputed from similar foods: " + "; ".join(
+            f"{food_name} ({', '.join(nutritionix_api.id_to_name_mapping.get(attr_id, str(attr_id)) for attr_id in attr_ids)})"
+            for food_name, attr_ids in imputed_by_food.items()))
+
+
+def analyse_recipe_job(context, key, name, ingredients, ingredients_input, custom_quantities,
+                       is_imputation_enabled):
+    # Fetches, completes and saves the analysis; the page reads it back from the recipe store
+    context.report_progress(0.0, f"Fetching {name}")
+    response, imputed_by_food = complete_recipe(ingredients_input, custom_quantities,
+                                                IngredientLibrary(nutrient_index), is_imputation_enabled)
+    context.check_cancelled()
+    context.report_progress(0.8, f"Checking {name} against the nutrient profiles")
+    recipe_store.put(key, name, ingredients, response, recipe_comparison.compare({name: response}))
+    return imputed_by_food
+
+
+# 7.final UI presentation
 def get_nutrient_info():
     st.title("Dog Food Formulator_nutritionix api")
+    recipe_name = st.text_input("Recipe name")
     ingredients_input = st.text_area("Enter ingredient list:")
     
-    # Add a checkbox for the manually added food item
-    is_pea_protein_added = st.checkbox("Include 10g Organic Raw Sprouted Pea Protein")
-    is_flaxseed_meal_added = st.checkbox("Include 3g Flaxseed Meal")
-    is_nutritional_yeast_added = st.checkbox("Include 3g Nutritional Yeast") 
+    # Custom ingredients (supplements, premixes) from the local library
+    ingredient_library = IngredientLibrary(nutrient_index)
+    selected_ingredients = st.multiselect("Include custom ingredients", ingredient_library.names)
+    custom_quantities = {}
+    for name in selected_ingredients:
+        ingredient = ingredient_library.get(name)
+        custom_quantities[name] = st.number_input(f"{name} ({ingredient['unit']})", min_value=0.0,
+                                                  value=float(ingredient["default_quantity"]))
+    selected_profiles = st.multiselect("Check against nutrient profiles", nutrient_profiles.names,
+                                       default=[name for name in nutrient_profiles.names if name.startswith("AAFCO Dog")])
+    is_imputation_enabled = st.checkbox("Fill missing amino acids and omega-3s from similar foods", value=True)
+    add_custom_ingredient_form(ingredient_library)
+    nutrient_ranking = st.radio("Rank top nutrients by", list(NUTRIENT_RANKINGS))
+    is_variability_enabled = st.checkbox("Estimate compliance probability from nutrient variability")
+    n_samples = st.number_input("Simulated batches", min_value=100, max_value=100000, value=10000, step=1000)
+    with st.expander("Feeding plan"):
+        roster_file = st.file_uploader(f"Dog roster CSV ({', '.join(ROSTER_COLUMNS)})", type="csv")
+        plan_days = st.number_input("Days to produce", min_value=1, value=7)
+        batch_size_kg = st.number_input("Batch size (kg)", min_value=0.1, value=50.0)
     
     # Create a Streamlit button to trigger the API call
-    if st.button("Get nutrient info"):
-        if ingredients_input or is_pea_protein_added:
-            response = nutritionix_api.get_nutrients\
-                                        (query=ingredients_input) \
-                                        if ingredients_input else {"foods": []}
+    is_analysis_requested = st.button("Get nutrient info")
+    saved_labels = {analysis["key"]: f"{analysis['name']} "
+                                     f"({time.strftime('%Y-%m-%d %H:%M', time.localtime(analysis['created_at']))})"
+                    for analysis in recipe_store.list()}
+    saved_key = st.sidebar.selectbox("Open saved analysis", [None] + list(saved_labels),
+                                     format_func=lambda key: saved_labels.get(key, "-"))
+
+    # The analysis shown is kept in the session, so it survives the reruns that poll its job
+    if is_analysis_requested and (ingredients_input or custom_quantities):
+        ingredients = normalize_ingredients(ingredients_input, custom_quantities,
+                                            {"imputation": is_imputation_enabled})
+        key = analysis_key(ingredients, f"{nutrient_index.version}-{ingredient_library.version}",
+                           nutrient_profiles.version)
+        st.session_state["analysis_key"] = key
+        st.session_state.pop("analysis_job", None)
+        if key in recipe_store:
+            # Same recipe, data and profiles as before: reuse the saved analysis
+            st.caption("Reopened saved analysis")
+        else:
+            name = recipe_name or (ingredients_input.splitlines()[0][:60] if ingredients_input
+                                   else "Custom ingredients")
+            st.session_state["analysis_job"] = job_runner.submit(
+                "analyse_recipe", key=key, name=name, ingredients=ingredients, ingredients_input=ingredients_input,
+                custom_quantities=custom_quantities, is_imputation_enabled=is_imputation_enabled)
+    elif saved_key != st.session_state.get("sidebar_key"):
+        st.session_state["sidebar_key"] = saved_key
+        if saved_key is not None:
+            st.session_state["analysis_key"] = saved_key
+            st.session_state.pop("analysis_job", None)
+
+    saved = None
+    key = st.session_state.get("analysis_key")
+    job_id = st.session_state.get("analysis_job")
+    imputed_by_food = job_result(job_id, "Analysis") if job_id else {}
+    if key is not None and imputed_by_food is not None:
+        display_imputed_nutrients(imputed_by_food)
+        try:
+            saved = recipe_store.get(key)
+        except ValueError as e:
+            st.error(f"Could not open saved analysis: {e}")
+
+    if saved is not None:
+        response = saved["response"]
+
+        #1 recipe summary, from the saved results
+        display_recipe_summary(response, saved["summary"])
+
+        #2 Aggregate and display the top 10 nutrients
+        aggregated_nutrients = nutrient_calculator.aggregate_nutrients(response)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            display_top_nutrients(response, nutrient_ranking, selected_profiles)
+
+        with col2:
+            display_macronutrient_pie_chart(aggregated_nutrients)
             
-            # Checkbox to import mannually added nutrient value
-            if is_pea_protein_added:
-                pea_protein_data = constants.SPROUTED_PEA_PROTEIN_DATA
-                response["foods"].append({"food_name": "10g Organic Raw Sprouted Pea Protein", 
-                                          "full_nutrients": pea_protein_data})
-            if is_flaxseed_meal_added:  
-                flaxseed_meal_data = constants.FLAXSEED_MEAL_DATA
-                response["foods"].append({"food_name": "3g Flaxseed Meal", 
-                                          "full_nutrients": flaxseed_meal_data})
-            if is_nutritional_yeast_added:  
-                nutritional_yeast_data = constants.NUTRITIONAL_YEAST_DATA 
-                response["foods"].append({"food_name": "5g Nutritional Yeast", 
-                                          "full_nutrients": nutritional_yeast_data})
-            if isinstance(response, dict):
-                
-                #1 recipe summary
-                display_recipe_summary(response)
-
-                #2 Aggregate and display the top 10 nutrients
-                aggregated_nutrients = nutrient_calculator.aggregate_nutrients(response)
-                top_10_nutrients = nutrient_calculator.display_top_10_nutrients(
-                                    aggregated_nutrients,
-                                    nutritionix_api.id_to_name_mapping,
-                                    nutritionix_api.id_to_unit_mapping)
-                
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.subheader("Top 10 Nutrients:")
-                    st.json({k: top_10_nutrients[k] for k in sorted(top_10_nutrients)})
-
-                with col2:
-                    display_macronutrient_pie_chart(aggregated_nutrients)
-                    
-                food_item_calorie_chart(response)
-                
-                #3 Compare actual to target
-                st.subheader("Comparison to AAFCO nutrient Profile")
-                
-                # AAFCO protein target
-                chart_title_protein = "AAFCO target - Amino acid"
-                comparison_results_protein = nutrient_calculator.compare_against_targets(
-                                            aggregated_nutrients, constants.aafco_cc_protein_targets)
-                display_nutrient_radar_chart(comparison_results_protein, chart_title_protein)
-                food_item_nutrient_chart(response, \
-                                         constants.aafco_cc_protein_targets, \
-                                         'Nutrient Component: Amino acid')
-                
-                # AAFCO fat target
-                chart_title_fat = "AAFCO target - Fatty acids"
-                comparison_results_fat = nutrient_calculator.compare_against_targets(
-                                            aggregated_nutrients, constants.aafco_cc_fat_targets)
-                display_nutrient_radar_chart(comparison_results_fat, chart_title_fat)
-                food_item_nutrient_chart(response, \
-                                         constants.aafco_cc_fat_targets, \
-                                         'Nutrient Component: Fats')
-
-                # AAFCO mineral target
-                st.subheader("AAFCO Target - Minerals")
-
-                # Radar chart split
-                chart_title_mineral = "AAFCO Target - Minerals"
-                comparison_results_mineral = nutrient_calculator.\
-                                            compare_against_targets(
-                                            aggregated_nutrients, 
-                                            constants.aafco_cc_mineral_targets)
-               
-                display_nutrient_radar_chart(comparison_results_mineral, \
-                                             chart_title_mineral, response, shrink=True)
-
-                food_item_nutrient_chart(response,\
-                                        constants.aafco_cc_mineral_targets,
-                                        'Nutrient Component: Vitamin') 
-                
-                
-                # AAFCO vitamin target
-                chart_title_v = "AAFCO Target - Vitamin"
-                comparison_results_v = nutrient_calculator.\
-                                        compare_against_targets(
-                                        aggregated_nutrients, constants.aafco_cc_vitamin_targets)
-                                        
-                display_nutrient_radar_chart(comparison_results_v, \
-                                             chart_title_v, response, shrink=True)
-                
-                food_item_nutrient_chart(response,\
-                                        constants.aafco_cc_vitamin_targets,
-                                        'Nutrient Component: Vitamin')
-                
-
-                #4 Display full details
-                st.subheader("Full Details:")
-                st.json(response)
+        food_item_calorie_chart(response)
+        
+        #3 Compare actual to the minimums of the selected profiles
+        st.subheader("Comparison to the selected nutrient profiles")
+        for group, group_title in TARGET_GROUPS:
+            targets = nutrient_profiles.targets(group, selected_profiles)
+            if not targets:
+                continue
+            comparison_results = nutrient_calculator.compare_against_targets(aggregated_nutrients, targets)
+            display_nutrient_radar_chart(comparison_results, f"Profile minimums - {group_title}")
+            food_item_nutrient_chart(response, targets, f"Nutrient Component: {group_title}")
+
+        # All selected standards, from the saved pass/fail results
+        display_profile_compliance(saved, selected_profiles)
+
+        if is_variability_enabled and selected_profiles:
+            display_compliance_probability(key, selected_profiles, int(n_samples))
+
+        if roster_file is not None:
+            display_feeding_plan(key, roster_file, plan_days, batch_size_kg)
+
+        #4 Display full details
+        st.subheader("Full Details:")
+        st.json(response)
+
+
+# 8. Compare several recipes side by side
+def parse_recipes(recipes_input):
+    # One recipe per block separated by a blank line, the first line is its name
+    recipes = {}
+    for block in recipes_input.strip().split("\n\n"):
+        lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+        if len(lines) > 1:
+            recipes[lines[0]] = "\n".join(lines[1:])
+    return recipes
+
+
+def fetch_recipes_job(context, recipes, is_imputation_enabled=True):
+    # Each recipe goes through the same completion step as "Analyze recipe"
+    ingredient_library = IngredientLibrary(nutrient_index)
+    responses, errors = {}, {}
+    for i, (name, query) in enumerate(recipes.items()):
+        context.check_cancelled()
+        try:
+            responses[name], _ = complete_recipe(query, {}, ingredient_library, is_imputation_enabled)
+        except ValueError as e:
+            errors[name] = str(e)
+        context.report_progress((i + 1) / len(recipes), f"Fetched {name} ({i + 1}/{len(recipes)})")
+    if errors:
+        # Failed fetches are worth retrying, so this result is not reused
+        context.skip_cache()
+    return {"responses": responses, "errors": errors}
+
+
+def compare_recipes():
+    st.title("Compare recipes")
+    recipes_input = st.text_area("Enter recipes, one block per recipe separated by a blank line, "
+                                 "with the recipe name on the first line. Custom ingredients (\"3g Flaxseed Meal\") "
+                                 "and branded items (\"nix:<id> 120g\") can be used as lines:", height=300)
+    recipes = parse_recipes(recipes_input)
+    baseline = st.selectbox("Baseline recipe", list(recipes)) if recipes else None
+    selected_profiles = st.multiselect("Check against nutrient profiles", nutrient_profiles.names,
+                                       default=[name for name in nutrient_profiles.names if name.startswith("AAFCO Dog")])
+    show_percent = st.checkbox("Show deltas as % of baseline")
+    is_imputation_enabled = st.checkbox("Fill missing amino acids and omega-3s from similar foods", value=True)
+
+    if st.button("Compare") and recipes:
+        st.session_state["compare_job"] = job_runner.submit("fetch_recipes", recipes=recipes,
+                                                            is_imputation_enabled=is_imputation_enabled)
+
+    # Recipes are fetched by the background job runner; this page only polls it
+    fetched = job_result(st.session_state.get("compare_job"), "Fetching recipes")
+    if fetched is None:
+        return
+    for name, error in fetched["errors"].items():
+        st.error(f"Could not analyse {name}: {error}")
+    responses = {name: fetched["responses"][name] for name in recipes if name in fetched["responses"]}
+    if not responses or baseline not in responses:
+        return
+
+    comparison = recipe_comparison.compare(responses, baseline, selected_profiles)
+    st.subheader("Summary")
+    st.dataframe(recipe_comparison.summary_table(comparison))
+
+    st.subheader(f"Difference from {baseline}")
+    st.dataframe(recipe_comparison.delta_table(comparison, percent=show_percent))
+
+    aggregated_by_recipe = {name: nutrient_calculator.aggregate_nutrients(response)
+                            for name, response in responses.items()}
+    for group, group_title in TARGET_GROUPS:
+        targets = nutrient_profiles.targets(group, selected_profiles)
+        if not targets:
+            continue
+        title = f"Profile minimums - {group_title}"
+        results_by_recipe = {name: nutrient_calculator.compare_against_targets(aggregated, targets)
+                             for name, aggregated in aggregated_by_recipe.items()}
+        baseline_results = results_by_recipe.pop(baseline)
+        display_nutrient_radar_chart(baseline_results, f"{title} ({baseline} targets)",
+                                     overlays=results_by_recipe)
+        recipe_nutrient_heatmap(comparison, targets, title)
+
+
+# 9. Explore cost, compliance and macronutrient trade-offs over an ingredient set
+def ingredient_per_gram(name, ingredient_library):
+    # Custom ingredients come from the library, branded "nix:<id>" items from the
+    # branded catalog, everything else from a 100 g Nutritionix lookup completed
+    # by the imputer, as the profile margin needs its amino acids and omega-3s
+    vector = ingredient_library.per_gram(name)
+    if vector is None and name.lower().startswith("nix:"):
+        vector = branded_catalog.per_gram(name[4:])
+    if vector is not None:
+        return vector
+    response = nutritionix_api.get_nutrients(query=f"100 g {name}")
+    if not isinstance(response, dict) or not response.get("foods"):
+        raise ValueError(f"Could not fetch {name}: {response}")
+    nutrient_imputer.add_response(response)
+    nutrient_imputer.impute_response(response)
+    food = response["foods"][0]
+    grams = food.get("serving_weight_grams") or 0
+    if grams <= 0:
+        raise ValueError(f"{name} has no serving weight")
+    return nutrient_index.food_vector(food) / grams
+
+
+def pareto_front_job(context, ingredients, cost_per_kg, lower, upper, profile, target_split, n_candidates, seed):
+    ingredient_library = IngredientLibrary(nutrient_index)
+    per_gram = []
+    for i, name in enumerate(ingredients):
+        context.check_cancelled()
+        per_gram.append(ingredient_per_gram(name, ingredient_library))
+        context.report_progress(0.05 * (i + 1) / len(ingredients), f"Fetched {name}")
+
+    row = nutrient_profiles.select([profile])[0]
+    # Limits on amino acid pairs apply to their sum, which is as linear in grams as any nutrient
+    explorer = ParetoExplorer(profile_amounts(np.vstack(per_gram), nutrient_index), np.array(cost_per_kg) / 1000,
+                              nutrient_profiles.minimums[row], nutrient_profiles.maximums[row],
+                              nutrient_index.positions([203, 204, 205]), ingredients)
+    return explorer.explore(lower, upper, target_split, n_candidates=n_candidates, seed=seed,
+                            progress=lambda done, message: context.report_progress(0.05 + 0.95 * done, message))
+
+
+def explore_tradeoffs():
+    st.title("Explore trade-offs")
+    ingredient_library = IngredientLibrary(nutrient_index)
+    ingredients_input = st.text_area("Enter ingredients to combine, one per line "
+                                     "(Nutritionix foods, custom ingredients or nix:<id> branded items):")
+    ingredients = [line.strip() for line in ingredients_input.splitlines() if line.strip()]
+
+    cost_per_kg, lower, upper = [], [], []
+    for name in ingredients:
+        col1, col2, col3 = st.columns(3)
+        custom = ingredient_library.get(name)
+        default_cost = (custom.get("cost_per_gram") or 0) * 1000 if custom else 0.0
+        cost_per_kg.append(col1.number_input(f"{name}: cost per kg", min_value=0.0, value=float(default_cost),
+                                             key=f"cost_{name}"))
+        lower.append(col2.number_input(f"{name}: min g", min_value=0.0, value=0.0, key=f"lower_{name}"))
+        upper.append(col3.number_input(f"{name}: max g", min_value=0.0, value=200.0, key=f"upper_{name}"))
+
+    profile = st.selectbox("Nutrient profile", nutrient_profiles.names)
+    st.write("Target energy split (% of ME)")
+    col1, col2, col3 = st.columns(3)
+    target_split = [col1.number_input("Protein", min_value=0.0, max_value=100.0, value=30.0),
+                    col2.number_input("Fat", min_value=0.0, max_value=100.0, value=50.0),
+                    col3.number_input("Carbohydrate", min_value=0.0, max_value=100.0, value=20.0)]
+    n_candidates = int(st.number_input("Candidate recipes", min_value=10000, max_value=10000000,
+                                       value=1000000, step=100000))
+
+    if st.button("Explore") and ingredients:
+        if any(high <= low for low, high in zip(lower, upper)):
+            st.error("Every ingredient needs a max above its min")
+        elif sum(target_split) == 0:
+            st.error("The target energy split needs at least one share above 0")
+        else:
+            st.session_state["pareto_job"] = job_runner.submit(
+                "pareto_front", ingredients=ingredients, cost_per_kg=cost_per_kg, lower=lower, upper=upper,
+                profile=profile, target_split=[share / sum(target_split) for share in target_split],
+                n_candidates=n_candidates, seed=0)
+
+    front_df = job_result(st.session_state.get("pareto_job"), "Exploration")
+    if front_df is None:
+        return
+    st.subheader(f"Pareto front ({len(front_df)} recipes)")
+    fig = px.scatter(front_df, x="cost_per_1000_kcal", y="profile_margin", color="macro_deviation",
+                     hover_data=[column for column in front_df.columns if column.endswith("(g)") or "% ME" in column],
+                     labels={"cost_per_1000_kcal": "Cost per 1000 kcal ME",
+                             "profile_margin": "Margin over profile (0 = just compliant)",
+                             "macro_deviation": "Deviation from target split"},
+                     color_continuous_scale="Viridis_r")
+    fig.add_hline(y=0, line_dash="dash")
+    st.plotly_chart(fig)
+    st.dataframe(front_df)
+    st.download_button("Download Pareto front", front_df.to_csv(index=False), file_name="pareto_front.csv")
 
 
 # Call the function to get nutrient info based on user input
-get_nutrient_info()
+job_runner = load_job_runner()
+mode = st.sidebar.radio("Mode", ["Analyze recipe", "Compare recipes", "Explore trade-offs"])
+if mode == "Compare recipes":
+    compare_recipes()
+elif mode == "Explore trade-offs":
+    explore_tradeoffs()
+else:
+    get_nutrient_info()
@@ -1,12 +1,21 @@
+import os
 import requests
 import pandas as pd
+import numpy as np
 import constants
+from nutrient_index import NutrientIndex
+from nutrient_profiles import metabolizable_energy
+from response_codec import ResponseCodec
 from typing import Any, Dict, Optional, Union
 from collections import Counter
 import math
+import heapq
 
 class NutritionixAPI:
-    BASE_URL = "https://trackapi.nutritionix.com"
+    # Overridable so the app can be pointed at a local stand-in (see load_test.py)
+    BASE_URL = os.getenv("NUTRITIONIX_BASE_URL", "https://trackapi.nutritionix.com")
+    # Seconds to wait for a reply before the request raises instead of hanging
+    REQUEST_TIMEOUT = 30
     
     def __init__(self, app_id: str, app_key: str):
         self.app_id = app_id
@@ -17,6 +26,10 @@ class NutritionixAPI:
             'Content-Type': 'application/json'
         }
         self.id_to_name_mapping = self._load_id_to_name_mapping()
+        # natural/nutrients responses keyed by normalized query, in the compact
+        # binary format of response_codec
+        self.response_codec = ResponseCodec(NutrientIndex())
+        self._nutrients_cache = {}
 
     def _load_id_to_name_mapping(self) -> Dict[int, str]:
         mapping_file_path = "data/Nutrition_mapping.csv"
@@ -31,20 +44,31 @@ class NutritionixAPI:
         Makes a request to the Nutritionix API and returns the JSON response.
         """
         url = f"{self.BASE_URL}{endpoint}"
-        response = requests.request(method, url, headers=self.headers, params=params, json=data)
+        response = requests.request(method, url, headers=self.headers, params=params, json=data,
+                                    timeout=self.REQUEST_TIMEOUT)
 
         if response.status_code == 200:
             return response.json()
         else:
             return response.text
 
-    def get_nutrients(self, query: str) -> Union[Dict[str, Any], str]:
+    def get_nutrients(self, query: str, use_cache: bool = True) -> Union[Dict[str, Any], str]:
         """
         Get detailed nutrient breakdown of any natural language text.
+
+        Successful responses are cached per query in compact form; cache hits
+        are decoded to a fresh dict that keeps the fields the app reads.
         """
+        cache_key = " ".join(query.lower().split())
+        if use_cache and cache_key in self._nutrients_cache:
+            return self.response_codec.decode(self._nutrients_cache[cache_key]).to_response()
+
         endpoint = "/v2/natural/nutrients"
         data = {"query": query}
-        return self._make_request("POST", endpoint, data=data)
+        response = self._make_request("POST", endpoint, data=data)
+        if isinstance(response, dict):
+            self._nutrients_cache[cache_key] = self.response_codec.encode(response)
+        return response
 
     def search_instant(self, query: str) -> Union[Dict[str, Any], str]:
         """
@@ -116,23 +140,61 @@ class NutrientCalculator:
         "carbohydrate_me": carbohydrate_me,
         "metabolizable_energy": metabolizable_energy}
 
-    def display_top_10_nutrients(self, aggregated_nutrients, id_to_name_mapping, id_to_unit_mapping):
-        nutrients_with_names_and_units = {
-            id_to_name_mapping.get(attr_id, f"Unknown ({attr_id})"): 
-                f"{value} {id_to_unit_mapping.get(attr_id, 'unit')}"
+    def display_top_10_nutrients(self, aggregated_nutrients, id_to_name_mapping, id_to_unit_mapping, n=10):
+        # Rank by amount in grams so g, mg and mcg are comparable; nutrients
+        # without a mass unit (kcal, kJ, IU) and total_calories are left out
+        amounts_in_grams = (
+            (attr_id, value * constants.unit_to_grams[id_to_unit_mapping[attr_id]])
             for attr_id, value in aggregated_nutrients.items()
-        }
-        sorted_nutrients = sorted(
-            nutrients_with_names_and_units.items(), 
-            key=lambda item: item[1], 
-            reverse=True
+            if id_to_unit_mapping.get(attr_id) in constants.unit_to_grams
         )
-        top_10_nutrients = dict(sorted_nutrients[:10])
-        return top_10_nutrients
+        top_nutrients = heapq.nlargest(n, amounts_in_grams, key=lambda item: item[1])
+        return {
+            id_to_name_mapping.get(attr_id, f"Unknown ({attr_id})"):
+                f"{aggregated_nutrients[attr_id]:.4g} {id_to_unit_mapping.get(attr_id, 'unit')}"
+            for attr_id, _ in top_nutrients
+        }
+
+    def rank_nutrients(self, nutrient_vectors, nutrient_index, by="amount", n=10, targets=None):
+        """
+        Top-n nutrients of one recipe (vector) or many recipes (matrix, one row per recipe).
+
+        by="amount" ranks by mass in grams, by="density" by grams per 1000 kcal
+        ME and by="percent_target" by percent of `targets`, a per-1000-kcal
+        minimum vector aligned to the nutrient index (e.g. a row of
+        NutrientProfiles.minimums). Returns (positions, scores), both shaped
+        (recipes, n) and ordered best first; unranked slots score NaN.
+        """
+        nutrient_vectors = np.atleast_2d(nutrient_vectors)
+        me = metabolizable_energy(nutrient_vectors, nutrient_index)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if by == "amount":
+                scores = nutrient_vectors * nutrient_index.grams_per_unit
+            elif by == "density":
+                scores = nutrient_vectors * nutrient_index.grams_per_unit / me[:, None] * 1000
+            elif by == "percent_target":
+                if targets is None:
+                    raise ValueError("Ranking by percent of target needs a targets vector")
+                scores = nutrient_vectors / (targets * me[:, None] / 1000) * 100
+            else:
+                raise ValueError(f"Unknown ranking: {by}")
+        scores = np.where(np.isfinite(scores), scores, -np.inf)
+
+        # Partial selection of the n best per recipe, then order just those n
+        n = min(n, scores.shape[1])
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        positions = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return positions, np.where(np.isfinite(top_scores), top_scores, np.nan)
    
 
     def compare_against_targets(self, aggregated_nutrients, targets):
-
+        """
+        Log-scaled recipe amount and minimum of every profile for targets from NutrientProfiles.targets.
+        """
         comparison_results = {}
         # Calculate caloric density and metabolizable energy using the NutrientCalculator class
         caloric_content_info = self.calculate_calorie_content_me(aggregated_nutrients)
@@ -141,28 +203,13 @@ class NutrientCalculator:
 
         # Iterate through each nutrient target in the targets
         for target in targets:
-            attr_id = target["attr_id"]
-            aafco_nutrient = target["aafco_nutrient"]
-
-            # Get the actual nutrient value from the aggregated nutrients
-            actual_value = aggregated_nutrients.get(attr_id, 0)
-
-            # Apply logarithmic scaling to the actual value
-            actual_value_log = math.log10(actual_value + 1)
-
-            # Get the target values for both 'Puppy & Growth' and 'Adult'
-            target_value_puppy = target["Puppy & Growth"] * scaling_factor
-            target_value_adult = target["Adult"] * scaling_factor
-
-            # Apply logarithmic scaling to the target values
-            target_value_puppy_log = math.log10(target_value_puppy + 1)
-            target_value_adult_log = math.log10(target_value_adult + 1)
+            # Get the actual nutrient value from the aggregated nutrients, summed for amino acid pairs
+            actual_value = sum(aggregated_nutrients.get(attr_id, 0) for attr_id in target["attr_ids"])
 
-            # Add the comparison results to the dictionary
-            comparison_results[aafco_nutrient] = {
-                "Actual": actual_value_log,
-                "Target Puppy": target_value_puppy_log,
-                "Target Adult": target_value_adult_log
+            # Apply logarithmic scaling to the actual value and to each profile's scaled minimum
+            comparison_results[target["nutrient"]] = {
+                "Actual": math.log10(actual_value + 1),
+                **{profile: math.log10(minimum * scaling_factor + 1) for profile, minimum in target["minimums"].items()},
             }
 
         return comparison_results
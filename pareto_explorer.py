@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+import constants
+
+OBJECTIVES = ["cost_per_1000_kcal", "profile_margin", "macro_deviation"]
+
+
+def _dominated_by(front: np.ndarray, points: np.ndarray) -> np.ndarray:
+    # Mask of points dominated by at least one row of front (all objectives minimized)
+    no_worse = (front[None, :, :] <= points[:, None, :]).all(axis=2)
+    better = (front[None, :, :] < points[:, None, :]).any(axis=2)
+    return (no_worse & better).any(axis=1)
+
+
+def non_dominated(objectives: np.ndarray, block_size: int = 512) -> np.ndarray:
+    """
+    Mask of the rows of a (points, objectives) array that no other row dominates.
+
+    All objectives are minimized. Points are visited in lexicographic order,
+    where no point can dominate one before it, so each block only has to be
+    checked against the front found so far and against itself.
+    """
+    order = np.lexsort(objectives.T[::-1])
+    keep = np.zeros(len(objectives), dtype=bool)
+    front = np.empty((0, objectives.shape[1]))
+    for start in range(0, len(order), block_size):
+        rows = order[start:start + block_size]
+        block = objectives[rows]
+        candidates = ~_dominated_by(front, block)
+        rows, block = rows[candidates], block[candidates]
+        survivors = ~_dominated_by(block, block)
+        keep[rows[survivors]] = True
+        front = np.vstack([front, block[survivors]])
+    return keep
+
+
+def evaluate_allocations(grams: np.ndarray, per_gram: np.ndarray, cost_per_gram: np.ndarray,
+                         minimums: np.ndarray, maximums: np.ndarray, macro_positions: np.ndarray,
+                         target_split: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Objectives for a batch of gram allocations, one row per candidate recipe.
+
+    per_gram is (ingredients, nutrients); minimums and maximums are per 1000
+    kcal ME over the same nutrients (NaN where unconstrained); macro_positions
+    are the protein, fat and carbohydrate columns.
+    """
+    totals = grams @ per_gram
+    macro_energy = totals[:, macro_positions] * np.array([constants.atwater_factors["protein"],
+                                                          constants.atwater_factors["fat"],
+                                                          constants.atwater_factors["carbohydrate"]])
+    me = macro_energy.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        split = macro_energy / me[:, None]
+        scale = me[:, None] / 1000
+        # Margin: worst ratio of actual to minimum, or of maximum to actual, minus 1
+        minimum_ratio = np.where(np.isnan(minimums), np.inf, totals / (minimums * scale))
+        maximum_ratio = np.where(np.isnan(maximums), np.inf, (maximums * scale) / totals)
+        margin = np.minimum(minimum_ratio.min(axis=1), maximum_ratio.min(axis=1)) - 1
+        cost = (grams @ cost_per_gram) / me * 1000
+
+    valid = me > 0
+    return {
+        "cost_per_1000_kcal": np.where(valid, cost, np.inf),
+        "profile_margin": np.where(valid, margin, -np.inf),
+        "macro_deviation": np.where(valid, np.abs(split - target_split).sum(axis=1), np.inf),
+        "split": np.nan_to_num(split),
+    }
+
+
+def _objective_matrix(evaluation: Dict[str, np.ndarray]) -> np.ndarray:
+    # Everything minimized: cost, negative margin, deviation from the target split
+    return np.column_stack([evaluation["cost_per_1000_kcal"], -evaluation["profile_margin"],
+                            evaluation["macro_deviation"]])
+
+
+def _explore_chunk(seed: int, n_candidates: int, batch_size: int, lower: np.ndarray, upper: np.ndarray,
+                   per_gram: np.ndarray, cost_per_gram: np.ndarray, minimums: np.ndarray,
+                   maximums: np.ndarray, macro_positions: np.ndarray, target_split: np.ndarray):
+    rng = np.random.default_rng(seed)
+    front_grams = np.empty((0, len(lower)))
+    front_objectives = np.empty((0, 3))
+    for start in range(0, n_candidates, batch_size):
+        size = min(batch_size, n_candidates - start)
+        grams = lower + rng.random((size, len(lower))) * (upper - lower)
+        objectives = _objective_matrix(evaluate_allocations(grams, per_gram, cost_per_gram, minimums,
+                                                            maximums, macro_positions, target_split))
+        finite = np.isfinite(objectives).all(axis=1)
+        grams, objectives = grams[finite], objectives[finite]
+
+        merged_grams = np.vstack([front_grams, grams])
+        merged_objectives = np.vstack([front_objectives, objectives])
+        keep = non_dominated(merged_objectives)
+        front_grams, front_objectives = merged_grams[keep], merged_objectives[keep]
+    return n_candidates, front_grams, front_objectives
+
+
+class ParetoExplorer:
+    """
+    Random search over gram allocations that keeps the Pareto front of
+    cost per 1000 kcal ME, margin over a nutrient profile and distance from a
+    target protein/fat/carbohydrate energy split.
+
+    Candidates are evaluated in vectorized batches (one matrix product per
+    batch) and split across worker processes, each keeping its own front;
+    the fronts are merged at the end.
+    """
+
+    def __init__(self, per_gram: np.ndarray, cost_per_gram: np.ndarray, minimums: np.ndarray,
+                 maximums: np.ndarray, macro_positions: np.ndarray, ingredient_names: List[str]):
+        # Only nutrients that matter to the objectives are carried around
+        columns = np.union1d(np.flatnonzero(~np.isnan(minimums) | ~np.isnan(maximums)), macro_positions)
+        self.per_gram = np.nan_to_num(per_gram[:, columns])
+        self.minimums = minimums[columns]
+        self.maximums = maximums[columns]
+        self.macro_positions = np.searchsorted(columns, macro_positions)
+        self.cost_per_gram = np.asarray(cost_per_gram, dtype=np.float64)
+        self.ingredient_names = ingredient_names
+
+    def explore(self, lower: np.ndarray, upper: np.ndarray, target_split: np.ndarray,
+                n_candidates: int = 1000000, batch_size: int = 20000, workers: Optional[int] = None,
+                seed: Optional[int] = None,
+                progress: Optional[Callable[[float, str], None]] = None) -> pd.DataFrame:
+        """
+        Sample n_candidates allocations with grams uniform in [lower, upper] per ingredient.
+
+        target_split holds the wanted protein, fat and carbohydrate fractions of
+        ME. Returns the Pareto front, one row per recipe.
+        """
+        lower = np.asarray(lower, dtype=np.float64)
+        upper = np.asarray(upper, dtype=np.float64)
+        target_split = np.asarray(target_split, dtype=np.float64)
+        workers = workers or os.cpu_count() or 1
+        # Several chunks per worker so progress can be reported as they finish
+        n_chunks = max(1, min(workers * 4, n_candidates // batch_size))
+        chunk_sizes = np.full(n_chunks, n_candidates // n_chunks)
+        chunk_sizes[:n_candidates % n_chunks] += 1
+        seeds = np.random.SeedSequence(seed).generate_state(n_chunks)
+        args = (batch_size, lower, upper, self.per_gram, self.cost_per_gram, self.minimums, self.maximums,
+                self.macro_positions, target_split)
+
+        fronts, done = [], 0
+        if workers == 1:
+            results = (_explore_chunk(int(s), int(size), *args) for s, size in zip(seeds, chunk_sizes))
+            for result in results:
+                done += result[0]
+                fronts.append(result[1:])
+                if progress:
+                    progress(done / n_candidates, f"Evaluated {done:,} of {n_candidates:,} candidates")
+        else:
+            # Workers are spawned rather than forked, as explore() usually runs on a job thread and
+            # forking a threaded process can copy locks held by other threads
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            try:
+                futures = [executor.submit(_explore_chunk, int(s), int(size), *args)
+                           for s, size in zip(seeds, chunk_sizes)]
+                for future in as_completed(futures):
+                    result = future.result()
+                    done += result[0]
+                    fronts.append(result[1:])
+                    if progress:
+                        progress(done / n_candidates, f"Evaluated {done:,} of {n_candidates:,} candidates")
+            except BaseException:
+                # A cancelled job (raised from progress) drops the chunks that haven't started
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            executor.shutdown()
+
+        grams = np.vstack([front[0] for front in fronts])
+        objectives = np.vstack([front[1] for front in fronts])
+        keep = non_dominated(objectives)
+        return self._front_frame(grams[keep], target_split)
+
+    def _front_frame(self, grams: np.ndarray, target_split: np.ndarray) -> pd.DataFrame:
+        evaluation = evaluate_allocations(grams, self.per_gram, self.cost_per_gram, self.minimums,
+                                          self.maximums, self.macro_positions, target_split)
+        front_df = pd.DataFrame(grams, columns=[f"{name} (g)" for name in self.ingredient_names])
+        for objective in OBJECTIVES:
+            front_df[objective] = evaluation[objective]
+        for i, macronutrient in enumerate(["Protein", "Fat", "Carbohydrate"]):
+            front_df[f"{macronutrient} % ME"] = evaluation["split"][:, i] * 100
+        return front_df.sort_values("cost_per_1000_kcal").reset_index(drop=True)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+from nutrient_index import NutrientIndex
+from nutrient_profiles import NutrientProfiles, metabolizable_energy
+
+
+class RecipeComparison:
+    """
+    Side-by-side comparison of several recipes against a baseline.
+
+    The recipes' nutrient totals are stacked into one (recipes, nutrients)
+    matrix, so ME, Ca:P, profile compliance and deltas for any number of
+    recipes are a few array operations.
+    """
+
+    def __init__(self, nutrient_index: NutrientIndex, nutrient_profiles: NutrientProfiles):
+        self.nutrient_index = nutrient_index
+        self.nutrient_profiles = nutrient_profiles
+
+    def compare(self, responses: Dict[str, Dict[str, Any]], baseline: Optional[str] = None,
+                profile_names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Compare named recipe responses. The first recipe is the baseline unless one is given.
+        """
+        names = list(responses)
+        if not names:
+            raise ValueError("Nothing to compare")
+        baseline = baseline or names[0]
+        baseline_row = names.index(baseline)
+
+        matrix = np.vstack([self.nutrient_index.response_vector(response) for response in responses.values()])
+        weights = np.array([sum(food.get("serving_weight_grams") or 0 for food in response.get("foods", []))
+                            for response in responses.values()], dtype=np.float64)
+        me = metabolizable_energy(matrix, self.nutrient_index)
+        calcium = matrix[:, self.nutrient_index.position[301]]
+        phosphorus = matrix[:, self.nutrient_index.position[305]]
+        water = matrix[:, self.nutrient_index.position[255]]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            deltas = matrix - matrix[baseline_row]
+            percent_deltas = np.where(matrix[baseline_row] != 0, deltas / matrix[baseline_row] * 100, np.nan)
+            ca_p_ratio = np.where(phosphorus != 0, calcium / phosphorus, 0)
+            kcal_per_kg = np.where(weights > 0, me / weights * 1000, 0)
+            moisture = np.where(weights > 0, water / weights * 100, 0)
+
+        return {
+            "names": names,
+            "baseline": baseline,
+            "matrix": matrix,
+            "weight": weights,
+            "me": me,
+            "kcal_per_kg": kcal_per_kg,
+            "ca_p_ratio": ca_p_ratio,
+            "moisture": moisture,
+            "deltas": deltas,
+            "percent_deltas": percent_deltas,
+            "evaluation": self.nutrient_profiles.evaluate(matrix, profile_names, me=me),
+        }
+
+    def summary_table(self, comparison: Dict[str, Any]) -> pd.DataFrame:
+        """
+        One row per recipe with ME, caloric density, Ca:P, moisture and compliance per profile.
+        """
+        summary_df = pd.DataFrame({
+            "Serving size (g)": comparison["weight"],
+            "ME (kcal)": comparison["me"],
+            "kcal/kg": comparison["kcal_per_kg"],
+            "Ca:P": comparison["ca_p_ratio"],
+            "Moisture %": comparison["moisture"],
+        }, index=comparison["names"])
+        evaluation = comparison["evaluation"]
+        failing = (~(evaluation["meets_minimum"] & evaluation["meets_maximum"])).sum(axis=2)
+        for p, profile in enumerate(evaluation["profiles"]):
+            summary_df[profile] = np.where(evaluation["compliant"][:, p], "Yes",
+                                           [f"No ({count} failing)" for count in failing[:, p]])
+        return summary_df
+
+    def delta_table(self, comparison: Dict[str, Any], attr_ids: Optional[List[int]] = None,
+                    percent: bool = False) -> pd.DataFrame:
+        """
+        Per-nutrient difference of every recipe from the baseline, one row per nutrient.
+
+        Defaults to the nutrients constrained by the loaded profiles.
+        """
+        positions = (self.nutrient_profiles.columns if attr_ids is None
+                     else self.nutrient_index.positions(attr_ids))
+        deltas = comparison["percent_deltas"] if percent else comparison["deltas"]
+        return pd.DataFrame(deltas[:, positions].T, columns=comparison["names"],
+                            index=[f"{self.nutrient_index.names[i]} ({self.nutrient_index.units[i]})"
+                                   for i in positions])
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from nutrient_index import NutrientIndex
+from nutrient_profiles import profile_amounts
+from response_codec import ResponseCodec
+
+RECIPE_STORE_PATH = "data/recipe_store.sqlite"
+
+
+def normalize_ingredients(query: str, custom_quantities: Dict[str, float],
+                          options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Canonical form of a recipe: sorted, lower-cased ingredient lines and custom quantities.
+    """
+    lines = sorted(" ".join(line.lower().split()) for line in query.splitlines() if line.strip())
+    return {
+        "query": lines,
+        "custom": {" ".join(name.lower().split()): float(quantity)
+                   for name, quantity in sorted(custom_quantities.items())},
+        "options": options or {},
+    }
+
+
+def analysis_key(ingredients: Dict[str, Any], data_version: str, profile_version: str) -> str:
+    """
+    Content hash identifying an analysis: same recipe, nutrient data and profiles, same key.
+    """
+    payload = json.dumps({"ingredients": ingredients, "data": data_version, "profiles": profile_version},
+                         sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecipeStore:
+    """
+    Content-addressed SQLite store of saved recipes and their analysis results.
+
+    Each row is keyed by analysis_key and holds the recipe, the analysed
+    response in response_codec's binary format and compact binary results:
+    the nutrient vector as float64, the profile limits as float32 and
+    pass/fail flags as packed bits. Reopening an analysis is a single
+    primary-key read. The connection is shared with the background job
+    threads that save analyses, so every query holds a lock.
+    """
+
+    def __init__(self, nutrient_index: NutrientIndex, path: str = RECIPE_STORE_PATH):
+        self.path = path
+        self.response_codec = ResponseCodec(nutrient_index)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                key TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                ingredients TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                response BLOB NOT NULL,
+                nutrients BLOB NOT NULL,
+                comparisons BLOB NOT NULL,
+                summary TEXT NOT NULL
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS analyses_created_at ON analyses (created_at)")
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self.connection.execute("SELECT 1 FROM analyses WHERE key = ?", (key,)).fetchone() is not None
+
+    def _encode_response(self, response: Dict[str, Any]) -> bytes:
+        return self.response_codec.encode(response)
+
+    def _decode_response(self, blob: bytes) -> Tuple[Dict[str, Any], Optional[np.ndarray]]:
+        """
+        The saved response, and its nutrient totals when they had to be re-aligned to a changed mapping.
+        """
+        compact = self.response_codec.decode(blob)
+        return compact.to_response(), compact.response_vector() if compact.realigned else None
+
+    def put(self, key: str, name: str, ingredients: Dict[str, Any], response: Dict[str, Any],
+            comparison: Dict[str, Any], row: int = 0):
+        """
+        Save one recipe of a RecipeComparison.compare result under key.
+        """
+        evaluation = comparison["evaluation"]
+        comparisons = b"".join([
+            evaluation["minimum"][row].astype(np.float32).tobytes(),
+            evaluation["maximum"][row].astype(np.float32).tobytes(),
+            np.packbits(evaluation["meets_minimum"][row]).tobytes(),
+            np.packbits(evaluation["meets_maximum"][row]).tobytes(),
+        ])
+        summary = {
+            "weight": float(comparison["weight"][row]),
+            "me": float(comparison["me"][row]),
+            "kcal_per_kg": float(comparison["kcal_per_kg"][row]),
+            "ca_p_ratio": float(comparison["ca_p_ratio"][row]),
+            "moisture": float(comparison["moisture"][row]),
+            "profiles": evaluation["profiles"],
+            "attr_ids": evaluation["attr_ids"].tolist(),
+            "compliant": evaluation["compliant"][row].tolist(),
+        }
+        encoded = self._encode_response(response)
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, name, json.dumps(ingredients, sort_keys=True), time.time(),
+                 encoded, comparison["matrix"][row].astype(np.float64).tobytes(),
+                 comparisons, json.dumps(summary)))
+            self.connection.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        A saved analysis by key, or None.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT name, ingredients, created_at, response, nutrients, comparisons, summary "
+                "FROM analyses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        name, ingredients, created_at, response, nutrients, comparisons, summary = row
+        summary = json.loads(summary)
+
+        shape = (len(summary["profiles"]), len(summary["attr_ids"]))
+        size = shape[0] * shape[1]
+        limits = np.frombuffer(comparisons, dtype=np.float32, count=2 * size)
+        flags = np.unpackbits(np.frombuffer(comparisons, dtype=np.uint8, offset=8 * size))
+        packed_size = len(flags) // 2
+        response, realigned_nutrients = self._decode_response(response)
+        # The stored vector follows the mapping at save time; use re-aligned totals after a mapping change
+        nutrients = np.frombuffer(nutrients, dtype=np.float64) if realigned_nutrients is None \
+            else realigned_nutrients
+        if len(nutrients) != len(self.response_codec.nutrient_index):
+            nutrients = self.response_codec.nutrient_index.response_vector(response)
+        minimum = limits[:size].reshape(shape)
+        maximum = limits[size:].reshape(shape)
+        meets_minimum = flags[:size].astype(bool).reshape(shape)
+        meets_maximum = flags[packed_size:packed_size + size].astype(bool).reshape(shape)
+        attr_ids = np.array(summary["attr_ids"], dtype=np.int64)
+        position = self.response_codec.nutrient_index.position
+        amounts = profile_amounts(nutrients, self.response_codec.nutrient_index)
+        actual = np.array([amounts[position[attr_id]] if attr_id in position else np.nan
+                           for attr_id in attr_ids.tolist()])
+        return {
+            "key": key,
+            "name": name,
+            "ingredients": json.loads(ingredients),
+            "created_at": created_at,
+            "response": response,
+            "nutrients": nutrients,
+            "minimum": minimum,
+            "maximum": maximum,
+            "meets_minimum": meets_minimum,
+            "meets_maximum": meets_maximum,
+            "summary": summary,
+            # The saved results in the shape of NutrientProfiles.evaluate for a single recipe
+            "evaluation": {
+                "profiles": summary["profiles"],
+                "attr_ids": attr_ids,
+                "me": np.array([summary["me"]]),
+                "actual": np.nan_to_num(actual)[None],
+                "minimum": minimum[None].astype(np.float64),
+                "maximum": maximum[None].astype(np.float64),
+                "meets_minimum": meets_minimum[None],
+                "meets_maximum": meets_maximum[None],
+                "compliant": np.array([summary["compliant"]], dtype=bool),
+            },
+        }
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Most recently saved analyses, newest first.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT key, name, created_at FROM analyses ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [{"key": key, "name": name, "created_at": created_at} for key, name, created_at in rows]
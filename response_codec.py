@@ -0,0 +1,130 @@
+import json
+import struct
+import numpy as np
+from typing import Any, Dict, List
+
+from nutrient_index import NutrientIndex
+
+MAGIC = b"NXC2"
+# magic, number of foods, number of nutrients, metadata length, nutrient index version
+HEADER = struct.Struct("<4sIII16s")
+
+# Food fields kept besides the nutrient values; everything else (photo, tags,
+# alt_measures, ...) is dropped because nothing downstream reads it
+FOOD_FIELDS = ["food_name", "serving_qty", "serving_unit", "serving_weight_grams",
+               "source", "custom_ingredient"]
+
+
+def _padding(offset: int) -> int:
+    return -offset % 8
+
+
+class CompactResponse:
+    """
+    A decoded compact response.
+
+    `matrix` is a read-only float64 view straight into the encoded bytes (a
+    re-aligned copy when the nutrient mapping has changed since), one row per
+    food over the nutrient index with NaN for nutrients a food does not
+    report, so nutrient math needs no dict conversion at all.
+    """
+
+    def __init__(self, nutrient_index: NutrientIndex, foods: List[Dict[str, Any]],
+                 matrix: np.ndarray, imputed: np.ndarray, realigned: bool = False):
+        self.nutrient_index = nutrient_index
+        self.foods = foods
+        self.matrix = matrix
+        self.imputed = imputed
+        self.realigned = realigned
+
+    def __len__(self) -> int:
+        return len(self.foods)
+
+    def response_vector(self) -> np.ndarray:
+        return np.nan_to_num(self.matrix).sum(axis=0)
+
+    def to_response(self) -> Dict[str, Any]:
+        """
+        The response in the natural/nutrients dict shape used by the rest of the app.
+        """
+        foods = []
+        for food, vector, imputed in zip(self.foods, self.matrix, self.imputed):
+            full_nutrients = self.nutrient_index.to_full_nutrients(vector)
+            imputed_ids = set(self.nutrient_index.attr_ids[imputed].tolist())
+            for nutrient in full_nutrients:
+                if nutrient["attr_id"] in imputed_ids:
+                    nutrient["imputed"] = True
+            decoded = dict(food)
+            decoded.update(self.nutrient_index.nf_fields(vector))
+            decoded["full_nutrients"] = full_nutrients
+            if imputed_ids:
+                decoded["imputed_nutrients"] = sorted(imputed_ids)
+            foods.append(decoded)
+        return {"foods": foods}
+
+
+class ResponseCodec:
+    """
+    Packs natural/nutrients responses into a fixed binary layout.
+
+    Layout: header, JSON food metadata, padding to 8 bytes, the int64 attr_id
+    of every column, a float64 (foods, nutrients) matrix over the nutrient
+    index, then the imputed flags as packed bits. nf_* fields are rebuilt
+    from the matrix on decode and attr_ids missing from the mapping file are
+    not kept. Blobs encoded under another mapping are re-aligned by attr_id.
+    """
+
+    def __init__(self, nutrient_index: NutrientIndex):
+        self.nutrient_index = nutrient_index
+
+    def encode(self, response: Dict[str, Any]) -> bytes:
+        foods = response.get("foods", [])
+        matrix = np.full((len(foods), len(self.nutrient_index)), np.nan, dtype="<f8")
+        imputed = np.zeros(matrix.shape, dtype=bool)
+        for row, food in enumerate(foods):
+            matrix[row] = self.nutrient_index.food_vector(food)
+            for nutrient in food.get("full_nutrients", []):
+                if nutrient.get("imputed") and nutrient.get("attr_id") in self.nutrient_index.position:
+                    imputed[row, self.nutrient_index.position[nutrient["attr_id"]]] = True
+
+        metadata = json.dumps([{field: food[field] for field in FOOD_FIELDS if field in food}
+                               for food in foods], separators=(",", ":")).encode("utf-8")
+        header = HEADER.pack(MAGIC, len(foods), len(self.nutrient_index), len(metadata),
+                             self.nutrient_index.version.encode("ascii"))
+        offset = HEADER.size + len(metadata)
+        return b"".join([header, metadata, b"\0" * _padding(offset),
+                         self.nutrient_index.attr_ids.astype("<i8").tobytes(), matrix.tobytes(),
+                         np.packbits(imputed).tobytes()])
+
+    def decode(self, blob: bytes) -> CompactResponse:
+        magic, n_foods, n_nutrients, metadata_length, version = HEADER.unpack_from(blob)
+        if magic != MAGIC:
+            raise ValueError("Not a compact response")
+        same_mapping = version.decode("ascii") == self.nutrient_index.version \
+            and n_nutrients == len(self.nutrient_index)
+
+        offset = HEADER.size
+        foods = json.loads(bytes(blob[offset:offset + metadata_length]))
+        offset += metadata_length
+        offset += _padding(offset)
+        attr_ids = np.frombuffer(blob, dtype="<i8", count=n_nutrients, offset=offset)
+        offset += 8 * n_nutrients
+        size = n_foods * n_nutrients
+        matrix = np.frombuffer(blob, dtype="<f8", count=size, offset=offset).reshape(n_foods, n_nutrients)
+        offset += 8 * size
+        imputed = np.unpackbits(np.frombuffer(blob, dtype=np.uint8, offset=offset), count=size)
+        imputed = imputed.astype(bool).reshape(n_foods, n_nutrients)
+        if not same_mapping:
+            matrix, imputed = self._realign(attr_ids, matrix, imputed)
+        return CompactResponse(self.nutrient_index, foods, matrix, imputed, realigned=not same_mapping)
+
+    def _realign(self, attr_ids: np.ndarray, matrix: np.ndarray, imputed: np.ndarray):
+        # Move the stored columns to the current index; attr_ids no longer mapped are dropped
+        aligned_matrix = np.full((len(matrix), len(self.nutrient_index)), np.nan)
+        aligned_imputed = np.zeros(aligned_matrix.shape, dtype=bool)
+        for column, attr_id in enumerate(attr_ids.tolist()):
+            i = self.nutrient_index.position.get(attr_id)
+            if i is not None:
+                aligned_matrix[:, i] = matrix[:, column]
+                aligned_imputed[:, i] = imputed[:, column]
+        return aligned_matrix, aligned_imputed
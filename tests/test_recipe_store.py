@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+PROFILE_CSV = """standard,species,life_stage,nutrient,group,attr_id,unit,min,max,notes
+Test,Dog,Adult,Crude protein,macronutrient,203,g,45,,
+Test,Dog,Adult,Crude fat,macronutrient,204,g,13.8,82.5,
+Test,Dog,Adult,Calcium,mineral,301,mg,1250,6250,
+"""
+
+
+@pytest.fixture
+def recipe_setup(monkeypatch, tmp_path):
+    # The nutrient mapping is read from data/ relative to the repo
+    monkeypatch.chdir(REPO_DIR)
+    from nutrient_index import NutrientIndex
+    from nutrient_profiles import NutrientProfiles
+    from recipe_comparison import RecipeComparison
+
+    # One profile over three nutrients: 3 flags per block, so the packed
+    # minimum and maximum flags each end mid-byte
+    profiles_dir = tmp_path / "profiles"
+    profiles_dir.mkdir()
+    (profiles_dir / "test_dog.csv").write_text(PROFILE_CSV)
+    nutrient_index = NutrientIndex()
+    nutrient_profiles = NutrientProfiles(nutrient_index, str(profiles_dir))
+    return nutrient_index, nutrient_profiles, RecipeComparison(nutrient_index, nutrient_profiles)
+
+
+def make_response(nutrient_index, seed):
+    rng = np.random.default_rng(seed)
+    foods = []
+    for i in range(3):
+        attr_ids = nutrient_index.attr_ids[rng.random(len(nutrient_index)) < 0.7]
+        foods.append({
+            "food_name": f"food {i}",
+            "serving_qty": 100,
+            "serving_unit": "g",
+            "serving_weight_grams": 100,
+            "full_nutrients": [{"attr_id": int(attr_id), "value": float(rng.gamma(1.0, 5.0))}
+                               for attr_id in attr_ids],
+        })
+    return {"foods": foods}
+
+
+def test_saved_comparisons_round_trip(recipe_setup, tmp_path):
+    from recipe_store import RecipeStore
+
+    nutrient_index, nutrient_profiles, recipe_comparison = recipe_setup
+    store = RecipeStore(nutrient_index, str(tmp_path / "recipes.sqlite"))
+    responses = {"a": make_response(nutrient_index, 0), "b": make_response(nutrient_index, 1)}
+    comparison = recipe_comparison.compare(responses)
+    evaluation = comparison["evaluation"]
+    assert evaluation["minimum"][0].shape == (1, 3)
+    # Make sure both outcomes of each flag are stored
+    assert not evaluation["meets_maximum"].all() or not evaluation["meets_minimum"].all()
+
+    for row, name in enumerate(responses):
+        store.put(name, name, {"query": [name]}, responses[name], comparison, row=row)
+
+    for row, name in enumerate(responses):
+        saved = store.get(name)
+        np.testing.assert_array_equal(saved["nutrients"], comparison["matrix"][row])
+        np.testing.assert_allclose(saved["minimum"], evaluation["minimum"][row], rtol=1e-6)
+        np.testing.assert_allclose(saved["maximum"], evaluation["maximum"][row], rtol=1e-6)
+        np.testing.assert_array_equal(saved["meets_minimum"], evaluation["meets_minimum"][row])
+        np.testing.assert_array_equal(saved["meets_maximum"], evaluation["meets_maximum"][row])
+        np.testing.assert_array_equal(saved["evaluation"]["compliant"][0], evaluation["compliant"][row])
+        np.testing.assert_allclose(saved["evaluation"]["actual"][0], evaluation["actual"][row])
+        assert saved["summary"]["me"] == pytest.approx(comparison["me"][row])
+    assert store.get("missing") is None